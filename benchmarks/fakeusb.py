@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""In-memory stand-ins for the pyusb objects used by USBPrinter and BrotherPrint.send"""
+import errno
+
+from libs.brotherprint import BrotherPrint
+from libs.transfer import ChunkedWriter
+
+
+class FakeEndpoint(object):
+    """ Bulk OUT endpoint recording every write """
+
+    def __init__(self, address=0x02, max_packet_size=64):
+        self.bEndpointAddress = address
+        self.wMaxPacketSize = max_packet_size
+        self.writes = 0
+        self.bytes = 0
+        self.data = bytearray()
+        self.keep = False
+
+    def write(self, data, timeout=None):
+        size = len(data)
+        self.writes += 1
+        self.bytes += size
+        if self.keep:
+            self.data += data if not isinstance(data, str) else data.encode('latin-1')
+        return size
+
+    def reset(self):
+        self.writes = 0
+        self.bytes = 0
+        del self.data[:]
+
+
+class FakeInEndpoint(object):
+    """ Bulk IN endpoint answering the status request with a fixed block, other reads time out """
+
+    def __init__(self, reply=None, address=0x81, max_packet_size=64):
+        self.bEndpointAddress = address
+        self.wMaxPacketSize = max_packet_size
+        if reply is None:
+            reply = bytearray(32)
+            reply[0], reply[1], reply[2], reply[10], reply[11] = 0x80, 0x20, 0x42, 24, 0x01
+        self.reply = bytes(reply)
+        self.pending = False
+        self.reads = 0
+
+    def read(self, size, timeout=None):
+        self.reads += 1
+        if not self.pending:
+            raise IOError(errno.ETIMEDOUT, 'Operation timed out')
+        self.pending = False
+        return self.reply[:size]
+
+
+class FakeUSBPrinter(object):
+    """ Same attributes as USBPrinter, without a device, jobs go through the same ChunkedWriter """
+
+    def __init__(self, max_packet_size=64):
+        self.out_ep = FakeEndpoint(max_packet_size=max_packet_size)
+        self.in_ep = FakeInEndpoint()
+        self.device = self
+        self.printer = BrotherPrint(self, self.out_ep, BrotherPrint.USB_INTERFACE)
+        self.printer.writer = ChunkedWriter(self.out_ep, self.in_ep)
+
+    def get_printer_status(self):
+        from libs.status import STATUS_REQUEST, decode_status
+        self.in_ep.pending = True
+        self.out_ep.write(STATUS_REQUEST)
+        return decode_status(self.in_ep.read(32))
+
+    def close(self):
+        return True
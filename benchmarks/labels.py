@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Per-label encode time, write calls, bytes written and allocations of every task type.
+
+The labels go through BrotherDriver.transfer() and the ChunkedWriter onto a fake USB printer,
+results are printed as JSON so runs of different versions can be compared.
+
+Run from the repository root: python -m benchmarks.labels [--labels N] [--output results.json]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from libs.BrtotherDriver import BrotherDriver
+from libs.jobqueue import PrintJob
+
+from .fakeusb import FakeUSBPrinter
+
+LABEL = {'label': '22-0000001', 'data': '22-0000001', 'company': 'XXXXX'}
+
+
+def tasks():
+    yield 'barcode', lambda i: dict(LABEL, data='22-%07d' % i, label='22-%07d' % i)
+    yield 'qrcode', lambda i: dict(LABEL, data='22-%07d' % i, label='22-%07d' % i)
+    yield 'template', lambda i: {'template': 1, 'fields': {'code': '22-%07d' % i, 'company': 'XXXXX'}}
+    yield 'batch', lambda i: {'task': 'barcode', 'labels': [dict(LABEL, data='22-%07d' % j) for j in range(10)],
+                              'cut': 'chain', 'cut_every': None}
+    try:
+        import numpy  # noqa
+        yield 'raster', lambda i: {'text': ['22-%07d' % i, 'XXXXX'], 'size': 32, 'tape_width': 12}
+    except ImportError:
+        pass
+
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def allocations(driver, printer, jobs):
+    """ Mean tracemalloc peak of a job above the memory traced before it, and the blocks and bytes all the
+    jobs left allocated. tracemalloc only sees live blocks: temporaries freed within a job show in its peak """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    peaks = 0
+    for job in jobs:
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        driver.transfer(printer, job)
+        peaks += tracemalloc.get_traced_memory()[1] - current
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    return (float(peaks) / len(jobs), sum(stat.count_diff for stat in stats),
+            sum(stat.size_diff for stat in stats))
+
+
+def bench(driver, task, make, labels):
+    printer = FakeUSBPrinter()
+    # warm the caches, the steady state is what matters on a print line
+    driver.transfer(printer, PrintJob(task, make(0)))
+    printer.out_ep.reset()
+    jobs = [PrintJob(task, make(i)) for i in range(labels)]
+    start = time.perf_counter()
+    for job in jobs:
+        driver.transfer(printer, job)
+    elapsed = time.perf_counter() - start
+    writes, written = printer.out_ep.writes, printer.out_ep.bytes
+    # a batch job prints several labels
+    weight = driver.task_weight(task, jobs[0].data)
+
+    # tracing slows every allocation down, a sample of the jobs is enough
+    traced = [PrintJob(task, make(i)) for i in range(min(len(jobs), 100))]
+    peak, blocks, size = allocations(driver, printer, traced)
+    traced_labels = float(len(traced) * weight)
+
+    labels *= weight
+    return {
+        'labels': labels,
+        'encode_us_per_label': elapsed / labels * 1e6,
+        'writes_per_label': float(writes) / labels,
+        'bytes_per_label': float(written) / labels,
+        'alloc_peak_bytes_per_job': peak,
+        'retained_blocks_per_label': blocks / traced_labels,
+        'retained_bytes_per_label': size / traced_labels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--labels', type=int, default=1000)
+    parser.add_argument('--output', help='also write the results to this file')
+    args = parser.parse_args()
+
+    driver = BrotherDriver(status_interval=None)
+    results = {
+        'revision': revision(),
+        'python': platform.python_version(),
+        'time': time.time(),
+        'tasks': dict((task, bench(driver, task, make, args.labels)) for task, make in tasks()),
+    }
+    text = json.dumps(results, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Wire bytes and encode time of raster lines, uncompressed against TIFF compression.
+
+Run from the repository root: python -m benchmarks.raster_codec
+"""
+import json
+import time
+
+import numpy as np
+
+from libs.raster import pack_lines, to_1bit
+from libs.rastercodec import RasterCodec
+
+
+def sample_images():
+    text = np.full((120, 600), 255, dtype=np.uint8)
+    text[30:90:6, 20:580] = 0
+    barcode = np.full((150, 400), 255, dtype=np.uint8)
+    barcode[:, 20:380][:, np.arange(360) % 7 < 3] = 0
+    noise = np.random.RandomState(0).randint(0, 256, (150, 300)).astype(np.uint8)
+    return {'text': text, 'barcode': barcode, 'noise': noise}
+
+
+def bench(lines, codec, repeat=50):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        data = codec.encode(lines)
+    return {'wire_bytes': len(data), 'encode_ms': (time.perf_counter() - start) / repeat * 1000}
+
+
+def main():
+    results = {}
+    for name, image in sample_images().items():
+        lines = pack_lines(to_1bit(image), 12)
+        raw = bench(lines, RasterCodec(None))
+        tiff = bench(lines, RasterCodec('tiff'))
+        tiff['ratio'] = float(raw['wire_bytes']) / tiff['wire_bytes']
+        results[name] = {'lines': lines.shape[0], 'none': raw, 'tiff': tiff}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Print every row of a CSV or JSONL export.
+
+    python ingest.py labels.csv --map data=code --set company=ACME --checkpoint labels.offset
+
+Run again with the same --checkpoint to resume after an interruption.
+"""
+import argparse
+import logging
+
+from libs.BrtotherDriver import BrotherDriver
+from libs.ingest import DEFAULT_MAPPING, ingest
+
+
+def pairs(values):
+    return dict(value.split('=', 1) for value in values or ())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='CSV or JSONL file')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help='guessed from the extension by default')
+    parser.add_argument('--task', default='barcode', choices=('barcode', 'qrcode', 'template'))
+    parser.add_argument('--template', type=int, help='template number for the template task')
+    parser.add_argument('--map', action='append', metavar='FIELD=COLUMN', help='column of a label field')
+    parser.add_argument('--set', action='append', metavar='FIELD=VALUE', help='constant label field')
+    parser.add_argument('--chunk-size', type=int, default=50, help='labels per job')
+    parser.add_argument('--max-pending', type=int, default=4, help='jobs in flight')
+    parser.add_argument('--cut', default='chain', choices=('chain', 'half', 'full'))
+    parser.add_argument('--cut-every', type=int)
+    parser.add_argument('--start', type=int, help='rows to skip, the checkpoint offset by default')
+    parser.add_argument('--checkpoint', help='file keeping the number of printed rows')
+    parser.add_argument('--host', help='network printer address, USB when missing')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    mapping = pairs(args.map)
+    if mapping and args.task != 'template':
+        mapping = dict(DEFAULT_MAPPING, **mapping)
+    driver = BrotherDriver(host=args.host, status_interval=None)
+    try:
+        printed = ingest(driver, args.source, args.task, mapping or None, pairs(args.set), args.format, args.start,
+                         chunk_size=args.chunk_size, max_pending=args.max_pending, cut=args.cut,
+                         cut_every=args.cut_every, template=args.template, checkpoint=args.checkpoint)
+        print('%d rows printed' % printed)
+    finally:
+        driver.stop()
+
+
+if __name__ == '__main__':
+    main()
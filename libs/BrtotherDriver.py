@@ -1,118 +1,315 @@
 # -*- coding: utf-8 -*-
 import logging
-import subprocess
-from threading import Thread, Lock
-from queue import Queue, Empty
-from datetime import datetime
-import json
+from threading import Event, Thread, Lock
+from concurrent.futures import BrokenExecutor, TimeoutError as FutureTimeout
+from queue import Empty, Full
+from collections import deque, OrderedDict
+import random
 import time
 import traceback
 
 
+from .devices import UsbDeviceIndex
+from .idempotency import IdempotencyIndex, TRANSMITTED
+from .jobqueue import JobHandle, JobQueue, PrintJob, PRIORITY_NORMAL, PRIORITY_STATUS, PRIORITY_STOP
+from .labelprogram import LabelProgramCache, page_end
+from .metrics import BYTES_BUCKETS, COUNT_BUCKETS, THROUGHPUT_BUCKETS, MetricsRegistry
+from .network import NetworkPrinter, RAW_PORT
 from .printer import USBPrinter
+from .status import StatusMonitor
 
-
-try:
-    import usb.core
-except ImportError:
-    usb = None
-
-BANNED_DEVICES = [
-    "0424:9514",  # Standard Microsystem Corp. Builtin Ethernet module
-    "1d6b:0002",  # Linux Foundation 2.0 root hub
-    "1d6b:0001",  # Linux Foundation 1.0 root hub
-    "0424:ec00",  # Standard Microsystem Corp. Other Builtin Ethernet module
-]
 drivers = {}
 
+# transport errors worth another attempt: usb.core.USBError, socket errors and timeouts are all OSError,
+# anything else (invalid label data, unknown task, encoding errors) would fail again the same way
+RETRYABLE_ERRORS = (IOError, OSError)
+
 _logger = logging.getLogger(__name__)
 
 
 class BrotherDriver(Thread):
-    def __init__(self):
+    def __init__(self, idle_timeout=30, device=None, devices=None, tags=(), deadline_policy='flag',
+                 maxsize=0, full_policy='block', max_retries=8, backoff_base=0.5, backoff_max=60,
+                 dead_letter_size=1000, history_size=1000, host=None, port=RAW_PORT, connections=None,
+                 status_interval=2.0, raster_compression='tiff', warm_start=False, render_workers=0,
+                 idempotency=None, discovery_interval=1.0, discovery_max=30, render_timeout=60):
+        """
+        @param idle_timeout : seconds without tasks after which the printer is closed, None to keep it open
+        @param device       : key of the UsbDeviceIndex entry to print on, the first printer found when None
+        @param devices      : UsbDeviceIndex shared with other drivers
+        @param tags         : labels used by PrinterPool affinity, e.g. tape width or task names
+        @param deadline_policy : 'flag' prints late jobs and reports them, 'drop' discards them
+        @param maxsize      : maximum number of queued jobs, 0 for no limit
+        @param full_policy  : what push_task does on a full queue, 'block', 'reject' (raises queue.Full)
+                              or 'drop-oldest'
+        @param max_retries  : attempts after the first one before a job goes to dead_letters
+        @param backoff_base : delay in seconds before the first retry, doubled on every attempt
+        @param backoff_max  : maximum delay in seconds between retries
+        @param dead_letter_size : number of failed jobs kept in dead_letters
+        @param history_size : number of finished jobs that get_job() still knows about
+        @param host         : address of a network printer, used instead of USB when set
+        @param port         : raw printing port of the network printer
+        @param connections  : TcpConnectionPool keeping the network connections open
+        @param status_interval : seconds between two status polls of the open printer, None to disable
+        @param raster_compression : 'tiff' to compress raster lines, None to send them raw
+        @param warm_start   : start the driver thread now and run warm_up() before the first job
+        @param render_workers : processes encoding raster, batch and template jobs ahead of the printer,
+                                0 to encode every job in the driver thread, None for one per core
+        @param render_timeout : seconds to wait for a render worker before encoding the job in the driver thread
+        @param idempotency  : IdempotencyIndex of the keys given to push_task, shared with other drivers
+        @param discovery_interval : seconds before looking again for a missing printer, doubled on every miss
+        @param discovery_max : maximum seconds between two looks for a missing printer, print jobs wait
+                               in the queue meanwhile without using their retries
+        """
         Thread.__init__(self)
-        self.queue = Queue()
+        if deadline_policy not in ('flag', 'drop'):
+            raise RuntimeError('Invalid deadline policy.')
+        self.queue = JobQueue(maxsize, full_policy)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dead_letters = deque(maxlen=dead_letter_size)
+        self.jobs = {}
+        self.finished = OrderedDict()
+        self.history_size = history_size
+        self.deadline_policy = deadline_policy
         self.lock = Lock()
+        self.device_lock = Lock()
+        self.status_interval = status_interval
+        self.monitor = None
         self.status = {'status': 'connecting', 'messages': []}
         self.isstarted = False
+        self.stopped = False
+        self.idle_timeout = idle_timeout
+        self.session = None
+        self.open_count = 0
+        self.close_count = 0
+        self.discovery_interval = discovery_interval
+        self.discovery_max = discovery_max
+        self.discovery_delay = 0
+        self.absent_until = 0.0
+        # a transfer failed midway, the printer may be left inside a command
+        self.interrupted = False
+        self.device = device
+        self.devices = devices if devices is not None else UsbDeviceIndex()
+        self.tags = set(tags)
+        self.host = host
+        self.port = port
+        self.connections = connections
+        self.pending = 0
+        self.programs = LabelProgramCache()
+        self.raster_compression = raster_compression
+        self.raster_codec = None
+        self.compositor = None
+        self.warm_start = warm_start
+        # a session opened by warm_up() is kept until the first print job, whatever idle_timeout is
+        self.warm = False
+        self.ready = Event()
+        self.idempotency = idempotency if idempotency is not None else IdempotencyIndex()
+        self.render_timeout = render_timeout
+        self.renderer = None
+        if render_workers != 0:
+            from .renderpool import RenderPool
+            self.renderer = RenderPool(render_workers, raster_compression)
+        self.metrics = MetricsRegistry()
+        self.init_metrics()
+        if warm_start:
+            self.lockedstart()
+
+    def init_metrics(self):
+        metrics = self.metrics
+        metrics.gauge('queue_depth', 'Jobs waiting in the queue.', function=lambda: self.queue.qsize())
+        metrics.gauge('pending_labels', 'Labels queued or printing.', function=lambda: self.pending)
+        self.queue_wait = metrics.histogram('queue_wait_seconds', 'Time between push and start of a job.')
+        self.jobs_total = metrics.counter('jobs_total', 'Finished jobs by task and final state.', ('task', 'state'))
+        self.retries_total = metrics.counter('retries_total', 'Job attempts scheduled again.', ('task',))
+        self.errors_total = metrics.counter('transfer_errors_total', 'Failed job attempts by error type.', ('error',))
+        metrics.counter('device_enumerations_total', 'USB bus enumerations.',
+                        function=lambda: self.devices.refresh_count)
+        metrics.counter('device_opens_total', 'Printer sessions opened.', function=lambda: self.open_count)
+        metrics.counter('device_closes_total', 'Printer sessions closed.', function=lambda: self.close_count)
+        metrics.counter('duplicates_suppressed_total', 'Jobs not queued because their key was already pushed.',
+                        function=lambda: self.idempotency.duplicates)
+        self.job_bytes = metrics.histogram('job_bytes', 'Bytes written per job.', ('task',), BYTES_BUCKETS)
+        self.job_writes = metrics.histogram('job_writes', 'Write calls per job.', ('task',), COUNT_BUCKETS)
+        self.encode_seconds = metrics.histogram('encode_seconds', 'Time spent building the job bytes.', ('task',))
+        self.transfer_seconds = metrics.histogram('transfer_seconds', 'Time spent writing a job.', ('task',))
+        self.throughput = metrics.histogram('transfer_bytes_per_second', 'Throughput of chunked USB writes.',
+                                            ('task',), THROUGHPUT_BUCKETS)
+
+    def get_metrics(self):
+        """ Snapshot of the driver metrics as a dict """
+        return self.metrics.snapshot()
+
+    def get_metrics_text(self):
+        """ Driver metrics in the Prometheus text format """
+        return self.metrics.prometheus()
 
     def connected_usb_devices(self):
-        connected = []
-
-        # printers can either define bDeviceClass=7, or they can define one of
-        # their interfaces with bInterfaceClass=7. This class checks for both.
-        class FindUsbClass(object):
-            def __init__(self, usb_class):
-                self._class = usb_class
-
-            def __call__(self, device):
-                # first, let's check the device
-                if device.bDeviceClass == self._class:
-                    return True
-                # transverse all devices and look through their interfaces to
-                # find a matching class
-                for cfg in device:
-                    intf = usb.util.find_descriptor(cfg, bInterfaceClass=self._class)
-
-                    if intf is not None:
-                        return True
-
-                return False
-
-        printers = usb.core.find(
-            find_all=True, custom_match=FindUsbClass(7))
-
-        # if no printers are found after this step we will take the
-        # first epson or star device we can find.
-
-        # brother
-        if not printers:
-            printers = usb.core.find(find_all=True, idVendor=0x04f9)
-        # epson
-        if not printers:
-            printers = usb.core.find(find_all=True, idVendor=0x04b8)
-        # star
-        if not printers:
-            printers = usb.core.find(find_all=True, idVendor=0x0519)
-        for device in printers:
-            try:
-                # device.set_configuration()
-                connected.append({
-                    'vendor': device.idVendor,
-                    'product': device.idProduct,
-                    'name': usb.util.get_string(
-                        device, device.iManufacturer) + " " + usb.util.get_string(
-                        device, device.iProduct)
-                })
-            except usb.core.USBError as usb_error:
-                print
-                "resource Busy" + str(usb_error)
-                if 'Resource busy' in str(usb_error):
-                    if device.is_kernel_driver_active(0):
-                        device.detach_kernel_driver(0)
-                        device.set_configuration()
-            device._langids = (1033,)
-
-        return connected
+        return self.devices.devices()
 
     def lockedstart(self):
-        if not self.isstarted:
-            self.daemon = False
-            self.start()
+        with self.lock:
+            if not self.isstarted and not self.is_alive():
+                self.daemon = False
+                self.start()
+                self.isstarted = True
+        if self.monitor is None:
+            self.start_monitor()
 
-    def get_usb_printer(self):
+    def usb_printers(self):
+        """ Cached printers, looked for again on the bus when the cache has none """
+        count = self.devices.refresh_count
         printers = self.connected_usb_devices()
+        if not printers and self.devices.refresh_count == count:
+            # the cached list may predate the printer being plugged in
+            printers = self.devices.refresh()
+        return printers
+
+    def get_usb_printer(self, timings=None):
+        start = time.time()
+        if self.device is not None:
+            entry = self.devices.lookup(key=self.device)
+            printers = [entry] if entry is not None else []
+        else:
+            printers = self.usb_printers()
+        if timings is not None:
+            timings['discovery'] = timings.get('discovery', 0.0) + time.time() - start
         if len(printers) > 0:
             self.set_status('connected', 'Connected to ' + printers[0]['name'])
-            return USBPrinter(printers[0]['vendor'], printers[0]['product'])
+            start = time.time()
+            printer = USBPrinter(printers[0]['vendor'], printers[0]['product'], device=printers[0]['device'])
+            if timings is not None:
+                timings['open'] = timings.get('open', 0.0) + time.time() - start
+            return printer
         else:
             self.set_status('disconnected', 'Printer Not Found')
             return None
 
+    def get_network_printer(self, timings=None):
+        start = time.time()
+        try:
+            printer = NetworkPrinter(self.host, self.port, self.connections)
+        except (IOError, OSError) as e:
+            self.set_status('disconnected', 'Printer %s:%d unreachable: %s' % (self.host, self.port, e))
+            return None
+        if timings is not None:
+            timings['open'] = timings.get('open', 0.0) + time.time() - start
+        self.set_status('connected', 'Connected to %s:%d' % (self.host, self.port))
+        return printer
+
+    def get_printer(self, timings=None):
+        if self.host is not None:
+            return self.get_network_printer(timings)
+        return self.get_usb_printer(timings)
+
+    def warm_up(self, raster=False):
+        """Discovers and opens the printer and builds the label programs before the first job.
+
+        The printer is configured when the session opens, so the first label only pays for its own
+        transfer. is_ready() tells when the driver got this far. The session stays open until the first
+        print job, idle_timeout only applies after it; use idle_timeout=None to never close it.
+
+        @param raster : also load the raster codec and text compositor (numpy and Pillow)
+        @return True if the printer is open
+        """
+        start = time.time()
+        for height in (125, 250):
+            self.programs.get('barcode', height=height)
+        self.programs.get('qrcode')
+        for cut in ('full', 'half', 'chain'):
+            page_end(cut)
+        if raster:
+            self.raster_stack()
+        try:
+            with self.device_lock:
+                printer = self.open_session()
+        except Exception as e:
+            _logger.warning('warm up failed: ' + str(e))
+            printer = None
+        if printer is None:
+            return False
+        self.warm = True
+        _logger.info('printer ready in %.3fs' % (time.time() - start))
+        return True
+
+    def is_ready(self):
+        """ True while a printer session is open, the label programs are built by then """
+        return self.ready.is_set()
+
+    def start_monitor(self):
+        with self.lock:
+            if self.monitor is not None or not self.status_interval:
+                return
+            self.monitor = StatusMonitor(self, self.status_interval)
+        self.monitor.start()
+
+    def stop(self, timeout=None):
+        """ Stop the driver thread after the jobs already queued and close the printer.
+        Jobs waiting for a retry fail, push_task raises RuntimeError from now on """
+        self.stopped = True
+        if not self.is_alive():
+            self.shutdown()
+            return
+        job = PrintJob('stop', priority=PRIORITY_STOP)
+        # requeue() ignores maxsize, stopping never blocks on or drops queued work
+        self.queue.resume()
+        self.queue.requeue(job)
+        job.future.result(timeout)
+        self.join(timeout)
+
+    def shutdown(self):
+        """ Fail the jobs left in the queue, close the printer and stop the monitor and render pool """
+        for job in self.queue.drain():
+            self.dead_letter(job, RuntimeError('Driver stopped'))
+        with self.device_lock:
+            self.close_session()
+        if self.monitor is not None:
+            self.monitor.stop()
+        if self.renderer is not None:
+            self.renderer.shutdown(False)
+
     def get_status(self):
-        self.get_usb_printer()
+        """ Last known status, refreshed in the background by the status monitor """
+        if self.monitor is None:
+            self.start_monitor()
+        if 'printer' not in self.status:
+            # first call, or no monitor: look now instead of reporting 'connecting'
+            if self.monitor is not None:
+                self.monitor.poll()
+            else:
+                self.probe()
         return self.status
 
+    def probe(self):
+        """ Look for the printer without opening a session, sets the connected or disconnected status """
+        if self.host is not None:
+            return self.get_network_printer() is not None
+        backing_off = time.monotonic() < self.absent_until
+        if backing_off:
+            # discovery is backing off, the cached list is recent enough
+            printers = self.connected_usb_devices()
+            if self.device is not None:
+                printers = [entry for entry in printers if entry['key'] == self.device]
+        elif self.device is not None:
+            # a pool worker only cares about its own printer
+            entry = self.devices.lookup(key=self.device)
+            printers = [entry] if entry is not None else []
+        else:
+            printers = self.usb_printers()
+        if printers:
+            self.set_status('connected', 'Found ' + printers[0]['name'])
+            if self.absent_until:
+                # back before the next discovery, let the held jobs through
+                self.discovery_delay = 0
+                self.absent_until = 0.0
+                self.queue.resume()
+        else:
+            self.set_status('disconnected', 'Printer Not Found')
+            if not backing_off:
+                self.printer_absent()
+        return len(printers) > 0
+
     def set_status(self, status, message=None):
         _logger.info(status + ' : ' + (message or 'no message'))
         if status == self.status['status']:
@@ -130,80 +327,528 @@ class BrotherDriver(Thread):
         elif status == 'disconnected' and message:
             _logger.warning('ESC/POS Device Disconnected: ' + message)
 
+    def open_session(self, timings=None):
+        """ Return the open printer, opening a new one if there is none or it is no longer usable """
+        if self.session is not None:
+            if getattr(self.session, 'device', None) is not None and getattr(self.session, 'printer', None):
+                return self.session
+            self.close_session(timings)
+        if time.monotonic() < self.absent_until:
+            # the printer was missing a moment ago, do not look for it again on every job
+            return None
+        printer = self.get_printer(timings)
+        if printer is None or printer.device is None:
+            self.ready.clear()
+            self.printer_absent()
+            return None
+        self.discovery_delay = 0
+        self.session = printer
+        self.open_count += 1
+        self.ready.set()
+        return self.session
+
+    def is_absent(self):
+        """ True while the printer is known to be missing """
+        return time.monotonic() < self.absent_until or self.status['status'] == 'disconnected'
+
+    def printer_absent(self):
+        """ Back off discovery, only status probes are served until the printer is looked for again """
+        self.discovery_delay = min(self.discovery_max, self.discovery_delay * 2 or self.discovery_interval)
+        self.absent_until = time.monotonic() + self.discovery_delay
+        if not self.stopped:
+            self.queue.pause(self.discovery_delay)
+
+    def close_session(self, timings=None):
+        if self.session is None:
+            return
+        session, self.session = self.session, None
+        self.ready.clear()
+        self.close_count += 1
+        start = time.time()
+        try:
+            if session.device is not None:
+                session.close()
+        except Exception as e:
+            _logger.warning('Error while closing printer: ' + str(e))
+        if timings is not None:
+            timings['close'] = timings.get('close', 0.0) + time.time() - start
+
+    def get_session_stats(self):
+        return {
+            'open': self.session is not None,
+            'open_count': self.open_count,
+            'close_count': self.close_count,
+            'ready': self.is_ready(),
+        }
+
     def run(self):
+        if self.warm_start:
+            self.warm_up()
         while True:
             try:
-                error = True
-                self.isstarted = True
-                timestamp, task, data = self.queue.get(True)
-                printer = self.get_usb_printer()
-                _logger.info(task)
-
-                if printer == None:
-                    if task != 'status':
-                        self.queue.put((timestamp, task, data))
-                    error = False
-                    time.sleep(5)
+                timeout = self.idle_timeout if self.session is not None and not self.warm else None
+                job = self.queue.get(True, timeout)
+            except Empty:
+                _logger.info('printer idle, closing session')
+                with self.device_lock:
+                    self.close_session()
+                continue
+            self.queue_wait.observe(job.timings.get('queue_wait', 0.0))
+            task, data = job.task, job.data
+            if task != 'status':
+                self.warm = False
+            if task == 'stop':
+                self.shutdown()
+                job.future.set_result(None)
+                return
+            if job.future.cancelled():
+                self.finish(job, 'cancelled')
+                continue
+            if job.expired() and task != 'status':
+                if self.deadline_policy == 'drop':
+                    self.dead_letter(job, 'deadline passed')
                     continue
-                elif task == 'barcode':
-                    error = False
-                    _logger.info("exec task barcode")
-                    self.printBarcode(printer, data)
-                elif task == 'qrcode':
-                    error = False
-                    _logger.info("exec task barcode")
-                    self.printQrCode(printer, data)
-                elif task == 'status':
-                    pass
-                error = False
+                job.late = True
+                _logger.warning('Job %s is late by %.3fs' % (task, time.time() - job.deadline))
+            try:
+                self.isstarted = True
+                job.state = 'running'
+                # outside the device lock, a slow render worker must not hold up status polls
+                rendered = self.rendered_bytes(job)
+                with self.device_lock:
+                    printer = self.open_session(job.timings)
+                    _logger.info(task)
+
+                    if printer == None:
+                        if task != 'status' and self.stopped:
+                            self.dead_letter(job, RuntimeError('Printer Not Found'))
+                        elif task != 'status':
+                            # waits for the printer in the paused queue, not an attempt
+                            job.state = 'queued'
+                            self.queue.requeue(job)
+                        else:
+                            self.job_done(job, self.status)
+                        continue
+                    result = self.transfer(printer, job, rendered)
+                self.job_done(job, result)
             except Exception as e:
                 self.set_status('error', str(e))
-                self.isstarted = False
-                errmsg = str(e) + '\n' + '-' * 60 + '\n' + traceback.format_exc() + '-' * 60 + '\n'
-                self.daemon = True
-                _logger.error(errmsg);
-            finally:
-                # self.isstarted =False
-                if error:
-                    self.queue.put((timestamp, task, data))
-                if printer:
-                    printer.close()
-
-    def push_task(self, task, data=None):
+                self.errors_total.labels(type(e).__name__).inc()
+                retryable = isinstance(e, RETRYABLE_ERRORS)
+                if retryable:
+                    self.interrupted = True
+                    with self.device_lock:
+                        self.close_session(job.timings)
+                    self.devices.invalidate()
+                else:
+                    errmsg = str(e) + '\n' + '-' * 60 + '\n' + traceback.format_exc() + '-' * 60 + '\n'
+                    _logger.error(errmsg);
+                if job.transmitted:
+                    # the label is printed, trying again would print it twice
+                    _logger.warning('Job %s failed after its transfer, not retried' % task)
+                    self.job_done(job)
+                elif job.partial:
+                    # the first labels may be printed, sending the job again would print them twice
+                    _logger.warning('Job %s failed after some of its labels were sent, not retried' % task)
+                    self.dead_letter(job, e)
+                elif retryable:
+                    self.retry(job, e)
+                else:
+                    self.dead_letter(job, e)
+
+    def transfer(self, printer, job, rendered=None):
+        """ Encode the job in the printer buffer, then send it with one transfer """
+        eprint = printer.printer
+        writes, written = eprint.writes, eprint.bytes_written
+        writer = eprint.writer
+        if writer is not None:
+            writer.last_stats = None
+        eprint.begin_job()
+        if self.interrupted:
+            eprint.invalidate()
+            eprint.initialize()
+        prefix = len(eprint.buffer)
+        try:
+            start = time.time()
+            result = self.encode(printer, job, rendered)
+            encoded = time.time()
+        except Exception:
+            eprint.discard_job()
+            raise
+        try:
+            eprint.end_job()
+        except Exception:
+            eprint.discard_job()
+            if self.label_sent(eprint, job, prefix):
+                job.partial = True
+                if job.key is not None:
+                    # a push again of the key must not print the labels already printed
+                    self.idempotency.mark_transmitted(job.key)
+            raise
+        self.interrupted = False
+        job.transmitted = True
+        if job.key is not None:
+            self.idempotency.mark_transmitted(job.key)
+        done = time.time()
+        job.add_timing('encode', encoded - start)
+        job.add_timing('transfer', done - encoded)
+        task = job.task
+        self.encode_seconds.labels(task).observe(encoded - start)
+        self.transfer_seconds.labels(task).observe(done - encoded)
+        self.job_bytes.labels(task).observe(eprint.bytes_written - written)
+        self.job_writes.labels(task).observe(eprint.writes - writes)
+        if writer is not None and writer.last_stats is not None:
+            self.throughput.labels(task).observe(writer.last_stats['bytes_per_second'])
+        return result
+
+    def label_sent(self, eprint, job, prefix):
+        """ True when a failed transfer of a job printing several labels went past the end of the first one
+        @param prefix : bytes sent before the job in the same transfer
+        """
+        end = self.first_label_end(job.task, job.data)
+        if end is None:
+            return False
+        sent = eprint.bytes_sent()
+        return sent is None or sent >= prefix + end
+
+    def first_label_end(self, task, data):
+        """ Size of the job bytes up to the end of its first label, None when the job prints one label """
+        if task == 'batch':
+            labels = data['labels']
+            if len(labels) < 2:
+                return None
+            program = self.label_program(data['task'], labels[0])
+            cut = 'full' if data.get('cut_every') == 1 else data.get('cut', 'chain')
+            return len(program.prologue) + len(program.fill(labels[0])) + len(page_end(cut))
+        if task == 'template':
+            records = data.get('records')
+            if records is None or len(records) < 2:
+                return None
+            from .renderpool import RecordingPrinter
+            session = RecordingPrinter()
+            self.printTemplate(session, dict(data, records=records[:1]))
+            return len(session.take())
+        return None
+
+    def encode(self, printer, job, rendered=None):
+        """ Put the job bytes in the printer buffer, rendered by the pool if the job was sent there """
+        if rendered is None:
+            rendered = self.rendered_bytes(job)
+        if rendered is not None:
+            printer.printer.send(rendered)
+            return None
+        return self.execute(printer, job.task, job.data)
+
+    def rendered_bytes(self, job):
+        """ Bytes of a job sent to the render pool, None to encode it in the driver thread """
+        if job.rendered is None:
+            return None
+        try:
+            return job.rendered.result(self.render_timeout)
+        except FutureTimeout:
+            _logger.warning('render of %s took more than %ss, encoding it in the driver thread'
+                            % (job.task, self.render_timeout))
+        except BrokenExecutor as e:
+            _logger.warning('render pool failed, encoding %s in the driver thread: %s' % (job.task, e))
+        job.rendered.cancel()
+        job.rendered = None
+        return None
+
+    def render_data(self, task, data):
+        """ Task data as sent to the render pool, raster jobs are rendered for the tape loaded now """
+        if task == 'raster' and not data.get('tape_width'):
+            return dict(data, tape_width=self.tape_width() or 24)
+        return data
+
+    def execute(self, printer, task, data):
+        if task == 'barcode':
+            _logger.info("exec task barcode")
+            self.printBarcode(printer, data)
+        elif task == 'qrcode':
+            _logger.info("exec task barcode")
+            self.printQrCode(printer, data)
+        elif task == 'template':
+            _logger.info("exec task template")
+            self.printTemplate(printer, data)
+        elif task == 'batch':
+            _logger.info("exec task batch")
+            self.printBatch(printer, data)
+        elif task == 'raster':
+            _logger.info("exec task raster")
+            self.printRaster(printer, data)
+        elif task == 'status':
+            return self.status
+
+    def retry_delay(self, attempts):
+        """ Exponential backoff with jitter: between half and all of base * 2^(attempts - 1), capped """
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def retry(self, job, reason):
+        job.attempts += 1
+        if job.attempts > self.max_retries:
+            self.dead_letter(job, reason)
+        else:
+            delay = self.retry_delay(job.attempts)
+            _logger.info('retrying %s in %.2fs (attempt %d): %s' % (job.task, delay, job.attempts, reason))
+            job.state = 'retrying'
+            self.retries_total.labels(job.task).inc()
+            self.queue.requeue(job, delay)
+
+    def dead_letter(self, job, reason):
+        """ Give up on a job, it is kept in dead_letters for inspection and its future fails with reason """
+        self.set_status('error', 'Job %s dropped: %s' % (job.task, reason))
+        self.dead_letters.append((job, reason))
+        self.finish(job, 'failed')
+        if not job.future.done():
+            job.future.set_exception(reason if isinstance(reason, BaseException) else RuntimeError(reason))
+
+    def job_done(self, job, result=None):
+        self.finish(job, 'done')
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def finish(self, job, state):
+        """ Move a job from the job table to the bounded history """
+        job.state = state
+        if job.rendered is not None:
+            # stops a render still waiting for a worker, then frees the bytes
+            job.rendered.cancel()
+            job.rendered = None
+        if job.key is not None:
+            if state in ('failed', 'cancelled'):
+                # nothing was printed, the client may push the key again
+                self.idempotency.release(job.key)
+            else:
+                self.idempotency.settle(job.key)
+        self.jobs_total.labels(job.task, state).inc()
+        self.task_done(job.task, job.data)
+        with self.lock:
+            self.jobs.pop(job.id, None)
+            self.finished[job.id] = job
+            while len(self.finished) > self.history_size:
+                self.finished.popitem(last=False)
+
+    def get_job(self, job_id):
+        """ JobHandle of a queued, running or recently finished job, None if unknown """
+        job = self.jobs.get(job_id) or self.finished.get(job_id)
+        return JobHandle(job, self) if job is not None else None
+
+    def hand_over(self):
+        """ Remove and return the queued jobs, for another driver to adopt() """
+        jobs = self.queue.drain()
+        with self.lock:
+            for job in jobs:
+                self.jobs.pop(job.id, None)
+                self.pending -= self.task_weight(job.task, job.data)
+        return jobs
+
+    def adopt(self, job):
+        """ Queue a job handed over by another driver, its future and idempotency key are kept """
+        with self.lock:
+            self.pending += self.task_weight(job.task, job.data)
+            self.jobs[job.id] = job
         self.lockedstart()
-        self.queue.put((time.time(), task, data))
+        job.state = 'queued'
+        # requeue() ignores maxsize, the job was already admitted
+        self.queue.requeue(job)
+
+    def cancel(self, job_id):
+        """ Cancel a job still waiting in the queue """
+        job = self.jobs.get(job_id)
+        if job is None or not self.queue.remove(job):
+            return False
+        self.finish(job, 'cancelled')
+        job.future.cancel()
+        return True
+
+    @staticmethod
+    def task_weight(task, data):
+        """ Number of labels a task prints, used to balance work between printers """
+        if task == 'batch':
+            return len(data['labels'])
+        if task == 'template' and data.get('records') is not None:
+            return len(data['records'])
+        if task == 'status':
+            return 0
+        return 1
+
+    def task_done(self, task, data):
+        with self.lock:
+            self.pending -= self.task_weight(task, data)
+
+    def push_task(self, task, data=None, priority=None, deadline=None, block=True, key=None):
+        """
+        @param priority : lower values are printed first, status probes go before any print work
+        @param deadline : time.time() by which the job should be printed
+        @param block    : wait for room when the queue is full and full_policy is 'block'
+        @param key      : idempotency key, a job pushed again with the key of a queued or printed job
+                          is not queued and the handle of the first job is returned
+        @return JobHandle, its result is available once the job is sent to the printer
+        """
+        if self.stopped:
+            raise RuntimeError('Driver stopped.')
+        if priority is None:
+            priority = PRIORITY_STATUS if task == 'status' else PRIORITY_NORMAL
+        self.lockedstart()
+        weight = self.task_weight(task, data)
+        job = PrintJob(task, data, priority=priority, deadline=deadline)
+        if key is not None:
+            original = self.idempotency.claim(key, job.id, job.future)
+            if original is not None:
+                return self.duplicate(job, original)
+            job.key = key
+        if self.renderer is not None and self.renderer.accepts(task):
+            job.rendered = self.renderer.submit(task, self.render_data(task, data))
+        with self.lock:
+            self.pending += weight
+            self.jobs[job.id] = job
+        try:
+            dropped = self.queue.put(job, block)
+        except Full:
+            with self.lock:
+                self.pending -= weight
+                self.jobs.pop(job.id, None)
+            if job.rendered is not None:
+                job.rendered.cancel()
+            if job.key is not None:
+                self.idempotency.release(job.key)
+            raise
+        if dropped is not None:
+            self.dead_letter(dropped, 'queue full')
+        return JobHandle(job, self)
+
+    def duplicate(self, job, original):
+        """ Handle of the job first pushed with the key of job. When this driver does not know it, e.g. it
+        runs on another driver of a PrinterPool, a stand-in resolved like the first job """
+        expiry, job_id, state, future = original
+        _logger.info('Job %s suppressed, duplicate of job %d (%s)' % (job.task, job_id, state))
+        handle = self.get_job(job_id)
+        if handle is not None:
+            return handle
+        job.state = 'duplicate'
+        job.transmitted = state == TRANSMITTED
+        if future is not None:
+            job.follow(future)
+        elif job.transmitted:
+            job.future.set_result(None)
+        else:
+            job.future.set_exception(RuntimeError('Job %d pushed with the same key is unknown' % job_id))
+        return JobHandle(job, self)
+
+    def key_state(self, key):
+        """ 'queued', 'transmitted' or None if the idempotency key is unknown or expired """
+        return self.idempotency.state(key)
+
+    def queue_wait_percentiles(self, percentiles=(50, 90, 99)):
+        return self.queue.wait_percentiles(percentiles)
+
+    def push_batch(self, task, labels, cut='chain', cut_every=None, priority=None, deadline=None, block=True,
+                   key=None):
+        """
+        @param task      : 'barcode' or 'qrcode'
+        @param labels    : list of label dicts, as given to push_task
+        @param cut       : cut between labels, 'chain', 'half' or 'full'
+        @param cut_every : full cut after every cut_every labels
+        @param key       : idempotency key of the whole batch, see push_task
+        """
+        if task not in ('barcode', 'qrcode'):
+            raise RuntimeError('Invalid batch task.')
+        if cut not in ('chain', 'half', 'full'):
+            raise RuntimeError('Invalid cut type.')
+        if cut_every is not None and cut_every < 1:
+            raise RuntimeError('cut_every must be at least 1.')
+        return self.push_task('batch', {'task': task, 'labels': list(labels), 'cut': cut, 'cut_every': cut_every},
+                              priority=priority, deadline=deadline, block=block, key=key)
+
+    def label_program(self, task, label):
+        if task == 'barcode':
+            pHeight = 125
+            if ('labelh' in label and label['labelh'] == 36):
+                pHeight = 250
+            return self.programs.get('barcode', height=pHeight)
+        elif task == 'qrcode':
+            return self.programs.get('qrcode')
+        raise RuntimeError('Task %s has no label program' % task)
 
     def printBarcode(self, eprint, label):
         _logger.info("try to print task barcode")
         _logger.info(label)
-        printer = eprint.printer
-        printer.command_mode()
-        printer.initialize()
-        printer.compressed_char('on')
-        printer.alignment('center')
-        printer.send(label['label'])
-        printer.line_feed()
-        pHeight = 125
-        if ('labelh' in label and label['labelh'] == 36):
-            pHeight = 250
-        printer.barcode(
-            label['data'].encode('utf8'), "code39", characters='on', height=pHeight,
-            equalize='on', width='xsmall', rss_symbol='rss14trun'
-        )
-        printer.line_feed()
-        printer.send(label['company'])
-        printer.print_page('full')
+        program = self.label_program('barcode', label)
+        eprint.printer.send(program.render(label, 'full'))
 
     def printQrCode(self, eprint, label):
         _logger.info("try to print taskQrCode")
         _logger.info(label)
+        program = self.label_program('qrcode', label)
+        eprint.printer.send(program.render(label, 'full'))
+
+    def printBatch(self, eprint, batch):
+        """ Print all the labels of a batch as one job: a single initialize, the batch cut
+        setting between labels and a full cut every cut_every labels and after the last one """
+        labels = batch['labels']
+        cut = batch.get('cut', 'chain')
+        cut_every = batch.get('cut_every')
+        _logger.info("try to print batch of %d %s labels" % (len(labels), batch['task']))
+        parts = []
+        last = len(labels) - 1
+        for i, label in enumerate(labels):
+            program = self.label_program(batch['task'], label)
+            if i == 0:
+                parts.append(program.prologue)
+            parts.append(program.fill(label))
+            if i == last or (cut_every and (i + 1) % cut_every == 0):
+                parts.append(page_end('full'))
+            else:
+                parts.append(page_end(cut))
+        if parts:
+            eprint.printer.send(b''.join(parts))
+
+    def printTemplate(self, eprint, data):
+        """ data: {'template': number stored on the printer,
+                   'fields': {object name: value}} for one label, or 'records': [fields, ...] for many """
+        _logger.info("try to print task template")
+        _logger.info(data)
+        records = data.get('records')
+        if records is None:
+            records = [data.get('fields', {})]
         printer = eprint.printer
-        printer.command_mode()
-        printer.initialize()
-        printer.compressed_char('on')
-        printer.alignment('center')
-        printer.send(label['label'])
-        printer.line_feed()
-        printer.qrcode(label['data'].encode('utf8'))
-        printer.print_page('full')
+        with printer.job():
+            printer.template_records(data['template'], records)
+
+    def tape_width(self):
+        """ Width in mm of the loaded tape as last reported by the status monitor """
+        width = self.status.get('printer', {}).get('media_width')
+        # 3.5 mm tape is reported as 4
+        return 3.5 if width == 4 else width
+
+    def affinity_tags(self):
+        """ Configured tags and the width of the loaded tape, e.g. '24mm', used by PrinterPool """
+        width = self.tape_width()
+        if not width:
+            return self.tags
+        return self.tags | {'%gmm' % width}
+
+    def raster_stack(self):
+        """ Raster codec and text compositor, numpy and Pillow are only imported for the first raster job """
+        if self.raster_codec is None:
+            from .compositor import TextCompositor
+            from .rastercodec import RasterCodec
+            self.compositor = TextCompositor()
+            self.raster_codec = RasterCodec(self.raster_compression)
+        return self.raster_codec, self.compositor
 
+    def printRaster(self, eprint, data):
+        """ data: {'image': PIL image or NumPy array, or 'text': list of lines rendered on the host
+                   with 'size' font size, 'tape_width': mm, the loaded tape when missing,
+                   'threshold': gray level, 'dither': True for ordered dithering} """
+        _logger.info("try to print task raster")
+        from .raster import render_image
+        codec, compositor = self.raster_stack()
+        tape_width = data.get('tape_width') or self.tape_width() or 24
+        image = data.get('image')
+        if image is None:
+            image = compositor.compose(data['text'], data.get('size', 24))
+        eprint.printer.send(render_image(image, tape_width, threshold=data.get('threshold', 128),
+                                         dither=data.get('dither', False), codec=codec))
+        _logger.info('raster compression: %s' % codec.last_stats)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import socket
+
+from .BrtotherDriver import BrotherDriver
+from .brotherprint import BrotherPrint, to_bytes
+from .labelprogram import LabelProgramCache
+
+
+class AsyncBrotherDriver(object):
+    """ asyncio front-end of BrotherDriver.
+
+    Jobs still run on the driver thread, the coroutines only wait on the job
+    futures so the event loop is never blocked by USB I/O.
+    """
+
+    def __init__(self, driver=None, **kwargs):
+        """
+        @param driver : BrotherDriver or PrinterPool to use, a new BrotherDriver(**kwargs) when None
+        """
+        self.driver = driver if driver is not None else BrotherDriver(**kwargs)
+
+    async def _push(self, push, *args, **kwargs):
+        # always in a worker thread: waiting for room, or a PrinterPool enumerating the USB bus in select(),
+        # must not block the event loop. The queue policy applies exactly like in a sync call
+        loop = asyncio.get_running_loop()
+        handle = await loop.run_in_executor(None, lambda: push(*args, **kwargs))
+        return await asyncio.wrap_future(handle.future)
+
+    async def print(self, task, data=None, priority=None, deadline=None, key=None):
+        """ Resolve once the label is sent to the printer, raise the error of its last attempt otherwise """
+        return await self._push(self.driver.push_task, task, data, priority=priority, deadline=deadline, key=key)
+
+    async def print_batch(self, task, labels, cut='chain', cut_every=None, priority=None, deadline=None, key=None):
+        return await self._push(self.driver.push_batch, task, labels, cut=cut, cut_every=cut_every,
+                                priority=priority, deadline=deadline, key=key)
+
+    async def get_status(self):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.driver.get_status)
+
+
+class AsyncWifiInterface(object):
+    """ Interface for BrotherPrint over an asyncio stream to the printer raw port.
+
+    send() only queues the bytes on the stream, await drain() to wait until
+    they are handed to the socket.
+    """
+
+    def __init__(self, host, port=9100):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        sock = self.writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return self
+
+    def send(self, data):
+        self.writer.write(to_bytes(data))
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def read(self, size=32):
+        return await self.reader.read(size)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.reader = self.writer = None
+
+
+class AsyncWifiPrinter(object):
+    """ Print labels on a network printer from a coroutine """
+
+    def __init__(self, host, port=9100, programs=None):
+        self.interface = AsyncWifiInterface(host, port)
+        self.printer = BrotherPrint(self.interface, None, BrotherPrint.WIFI_INTERFACE)
+        self.programs = programs if programs is not None else LabelProgramCache()
+
+    async def connect(self):
+        await self.interface.connect()
+        return self
+
+    async def send(self, data):
+        self.printer.send(data)
+        await self.interface.drain()
+
+    async def print_label(self, task, label, cut='full', **options):
+        """
+        @param task    : 'barcode' or 'qrcode'
+        @param label   : dict with the label fields
+        @param options : fixed layout options, e.g. height for barcodes
+        """
+        program = self.programs.get(task, **options)
+        await self.send(program.render(label, cut))
+
+    async def close(self):
+        await self.interface.close()
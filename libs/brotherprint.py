@@ -7,7 +7,56 @@ printers without having to memorize the ESC/P commands. Also handles sending to
 for you.
 """
 import re
-from io import BytesIO
+import struct
+from contextlib import contextmanager
+
+INITIALIZE = b'\x1b@'
+# longer than any command or raster line, pads out one a broken transfer cut short
+INVALIDATE = b'\x00' * 200
+COMMAND_MODE = b'\x1bia0'
+RASTER_MODE = b'\x1bia\x01'
+TEMPLATE_MODE = b'\x1bia3'
+CARRIAGE_RETURN = b'\r'
+LINE_FEED = b'\n'
+PAGE_FEED = b'\x0c'
+HORZ_TAB = b'\t'
+VERT_TAB = b'\x0b'
+CLEAR_HORZ_TABS = b'\x1bD\x00'
+CLEAR_VERT_TABS = b'\x1bB\x00'
+PICA_PITCH = b'\x1bP'
+ELITE_PITCH = b'\x1bM'
+MICRON_PITCH = b'\x1bg'
+BARCODE_END = b'\\'
+CODE128_END = b'\\\\\\'
+QRCODE_END = b'\\\\\\'
+TEMPLATE_PRINT = b'^FF'
+TEMPLATE_INIT = b'^II'
+
+_WORD = struct.Struct('<H')
+_TWO_WORDS = struct.Struct('<HH')
+
+
+def to_bytes(text):
+    """Converts a command or text fragment to the bytes sent on the wire.
+
+    Text is encoded as latin-1 so every character maps to one byte, bytes are returned as they are.
+    Text the printer cannot print is refused rather than printed as '?'.
+
+    Args:
+        text: String or bytes-like object.
+    Returns:
+        bytes, or the bytes-like object itself
+    Raises:
+        RuntimeError: Text with characters outside latin-1.
+    """
+    if isinstance(text, str):
+        try:
+            return text.encode('latin-1')
+        except UnicodeEncodeError as e:
+            raise RuntimeError('Cannot encode %r as latin-1: %s' % (text, e.reason))
+    if isinstance(text, (bytes, bytearray, memoryview)):
+        return text
+    return bytes(text)
 
 
 class BrotherPrint(object):
@@ -17,12 +66,105 @@ class BrotherPrint(object):
 
     font_types = {'bitmap': 0, 'outline': 1}
 
+    # option -> complete command bytes
+    CHARSETS = dict((name, b'\x1bR' + bytes((code,))) for name, code in (
+        ('USA', 0), ('France', 1), ('Germany', 2), ('UK', 3), ('Denmark', 4), ('Sweden', 5), ('Italy', 6),
+        ('Spain', 7), ('Japan', 8), ('Norway', 9), ('Denmark II', 10), ('Spain II', 11), ('Latin America', 12),
+        ('South Korea', 13), ('Legal', 64)))
+    CHAR_CODE_TABLES = {'standard': b'\x1bt\x00',
+                        'eastern european': b'\x1bt\x01',
+                        'western european': b'\x1bt\x02',
+                        'spare': b'\x1bt\x03'}
+    CUT_SETTINGS = {'full': b'\x1biC\x01',
+                    'half': b'\x1biC\x02',
+                    'chain': b'\x1biC\x04',
+                    'special': b'\x1biC\x08'}
+    ROTATIONS = {'rotate': b'\x1biL1',
+                 'cancel': b'\x1biL0'}
+    FEED_AMOUNTS = {'1/8': b'\x1b0',
+                    '1/6': b'\x1b2'}
+    ALIGNMENTS = {'left': b'\x1ba0',
+                  'center': b'\x1ba1',
+                  'right': b'\x1ba2',
+                  'justified': b'\x1ba3'}
+    FRAMES = {'on': b'\x1bif1',
+              'off': b'\x1bif0'}
+    BOLD = {'on': b'\x1bE', 'off': b'\x1bF'}
+    ITALIC = {'on': b'\x1b4', 'off': b'\x1b5'}
+    DOUBLE_STRIKE = {'on': b'\x1bG', 'off': b'\x1bH'}
+    DOUBLE_WIDTH = {'on': b'\x1bW1', 'off': b'\x1bW0'}
+    COMPRESSED_CHAR = {'on': b'\x0f', 'off': b'\x12'}
+    UNDERLINE = {'off': b'\x1b-0', '0': b'\x1b-0', '1': b'\x1b-1', '2': b'\x1b-2', '3': b'\x1b-3',
+                 '4': b'\x1b-4'}
+    BITMAP_SIZES = ('24', '32', '48')
+    CHAR_SIZES = dict((size, b'\x1bX\x00' + bytes((int(size), kind))) for size, kind in (
+        ('24', 0), ('32', 0), ('48', 0), ('33', 0), ('38', 0), ('42', 0), ('46', 0), ('50', 0), ('58', 0),
+        ('67', 0), ('75', 0), ('83', 0), ('92', 0), ('100', 0), ('117', 0), ('133', 0), ('150', 0), ('167', 0),
+        ('200', 0), ('233', 0), ('11', 1), ('44', 1), ('77', 1), ('111', 1), ('144', 1)))
+    FONTS = dict((name, b'\x1bk' + bytes((code,))) for name, code in (
+        ('brougham', 0), ('lettergothicbold', 1), ('brusselsbit', 2), ('helsinkibit', 3), ('sandiego', 4),
+        ('lettergothic', 9), ('brusselsoutline', 10), ('helsinkioutline', 11)))
+    BITMAP_FONTS = ('brougham', 'lettergothicbold', 'brusselsbit', 'helsinkibit', 'sandiego')
+    CHAR_STYLES = {'normal': b'\x1bq\x00',
+                   'outline': b'\x1bq\x01',
+                   'shadow': b'\x1bq\x02',
+                   'outlineshadow': b'\x1bq\x03'}
+    PROPORTIONAL = {'off': b'\x1bp\x00',
+                    'on': b'\x1bp\x01'}
+
+    BARCODE_FORMATS = {'code39': b'\x1bit0',
+                       'itf': b'\x1bit1',
+                       'ean8/upca': b'\x1bit5',
+                       'upce': b'\x1bit6',
+                       'codabar': b'\x1bit9',
+                       'code128': b'\x1bita',
+                       'gs1-128': b'\x1bitb',
+                       'rss': b'\x1bitc'}
+    BARCODE_WIDTHS = {'xsmall': b'w0', 'small': b'w1', 'medium': b'w2', 'large': b'w3'}
+    BARCODE_RATIOS = {'3:1': b'z0', '2.5:1': b'z1', '2:1': b'z2'}
+    BARCODE_RSS_SYMBOLS = {'rss14std': b'o0',
+                           'rss14trun': b'o1',
+                           'rss14stacked': b'o2',
+                           'rss14stackedomni': b'o3',
+                           'rsslimited': b'o4',
+                           'rssexpandedstd': b'o5',
+                           'rssexpandedstacked': b'o6'}
+    BARCODE_CHARACTERS = {'off': b'spr0uxyh', 'on': b'spr1uxyh'}
+    BARCODE_PARENTHESES = {'off': b'e1', 'on': b'e0'}
+    BARCODE_EQUALIZE = {'off': b'f0b', 'on': b'f1b'}
+
+    QRCODE_SIZES = {'Prints 4 dots': 4,
+                    'Prints 6 dots': 6,
+                    'Prints 8 dots': 8,
+                    'Prints 10 dots': 10,
+                    'Prints 12 dots': 12}
+    QRCODE_MODELS = {'MODEL1': 1,
+                     'MODEL2': 2,
+                     'Micro QR': 3}
+    QRCODE_CORRECTIONS = {'High-density level L': 1,
+                          'Standard level M': 2,
+                          'High-reliability level': 3,
+                          'Ultra-high-reliability level': 4}
+
+    MACHINE_OPS = {'feed2start': b'^OP\x01',
+                   'feedone': b'^OP\x02',
+                   'cut': b'^OP\x03'}
+    PRINT_START_TRIGGERS = {'received': b'^PT\x01',
+                            'filled': b'^PT\x02',
+                            'num_received': b'^PT\x03'}
+
     def __init__(self, interface, ep, interface_type=WIFI_INTERFACE):
         self.interface = interface
         self.ep = ep
         self.interface_type = ''  # This exists only for definition.
         self.set_interface_type(interface_type)
         self.fonttype = self.font_types['bitmap']
+        self.buffer = bytearray()
+        self.buffering = False
+        self.job_depth = 0
+        self.writer = None
+        self.writes = 0
+        self.bytes_written = 0
 
     ###########################################################################
     # System Commands & Settings
@@ -53,7 +195,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(27) + 'ia' + chr(1))
+        self.send(RASTER_MODE)
 
     def template_mode(self):
         """Sets printer to template mode
@@ -65,7 +207,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(27) + 'i' + 'a' + '3')
+        self.send(TEMPLATE_MODE)
 
     def command_mode(self):
         """Calling this function sets the printer to ESC/P command mode.
@@ -77,7 +219,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(27) + chr(105) + chr(97) + '0')
+        self.send(COMMAND_MODE)
 
     def initialize(self):
         """Calling this function initializes the printer.
@@ -90,7 +232,19 @@ class BrotherPrint(object):
             None
         """
         self.fonttype = self.font_types['bitmap']
-        self.send(chr(27) + chr(64))
+        self.send(INITIALIZE)
+
+    def invalidate(self):
+        """Ends whatever command an interrupted transfer left incomplete, send initialize() next.
+
+        Args:
+            None
+        Returns:
+            None
+        Raises:
+            None
+        """
+        self.send(INVALIDATE)
 
     def select_charset(self, charset):
         """Select international character set and changes codes in code table accordingly
@@ -102,24 +256,8 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid charset.
         """
-        charsets = {'USA': 0,
-                    'France': 1,
-                    'Germany': 2,
-                    'UK': 3,
-                    'Denmark': 4,
-                    'Sweden': 5,
-                    'Italy': 6,
-                    'Spain': 7,
-                    'Japan': 8,
-                    'Norway': 9,
-                    'Denmark II': 10,
-                    'Spain II': 11,
-                    'Latin America': 12,
-                    'South Korea': 13,
-                    'Legal': 64,
-                    }
-        if charset in charsets:
-            self.send(chr(27) + 'R' + chr(charsets[charset]))
+        if charset in self.CHARSETS:
+            self.send(self.CHARSETS[charset])
         else:
             raise RuntimeError('Invalid charset.')
 
@@ -134,13 +272,8 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid chartable.
         """
-        tables = {'standard': 0,
-                  'eastern european': 1,
-                  'western european': 2,
-                  'spare': 3
-                  }
-        if table in tables:
-            self.send(chr(27) + 't' + chr(tables[table]))
+        if table in self.CHAR_CODE_TABLES:
+            self.send(self.CHAR_CODE_TABLES[table])
         else:
             raise RuntimeError('Invalid char table.')
 
@@ -154,14 +287,8 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid cut type.
         """
-
-        cut_settings = {'full': 0b00000001,
-                        'half': 0b00000010,
-                        'chain': 0b00000100,
-                        'special': 0b00001000
-                        }
-        if cut in cut_settings:
-            self.send(chr(27) + 'iC' + chr(cut_settings[cut]))
+        if cut in self.CUT_SETTINGS:
+            self.send(self.CUT_SETTINGS[cut])
         else:
             raise RuntimeError('Invalid cut type.')
 
@@ -180,13 +307,9 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid action.
         """
-        if action == 'rotate':
-            action = '1'
-        elif action == 'cancel':
-            action = '0'
-        else:
+        if action not in self.ROTATIONS:
             raise RuntimeError('Invalid action.')
-        self.send(chr(27) + chr(105) + chr(76) + action)
+        self.send(self.ROTATIONS[action])
 
     def feed_amount(self, amount):
         """Calling this function sets the form feed amount to the specified setting.
@@ -199,23 +322,16 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        n = None
-        if amount == '1/8':
-            amount = '0'
-        elif amount == '1/6':
-            amount = '2'
-        elif re.search('/180', amount):
-            n = re.search(r"(\d+)/180", amount)
-            n = n.group(1)
-            amount = '3'
-        elif re.search('/60', amount):
-            n = re.search(r"(\d+)/60", amount)
-            n = n.group(1)
-            amount = 'A'
+        if amount in self.FEED_AMOUNTS:
+            self.send(self.FEED_AMOUNTS[amount])
+            return
+        n = re.search(r"(\d+)/180", amount)
         if n:
-            self.send(chr(27) + amount + n)
-        else:
-            self.send(chr(27) + amount)
+            self.send(b'\x1b3' + bytes((int(n.group(1)),)))
+            return
+        n = re.search(r"(\d+)/60", amount)
+        if n:
+            self.send(b'\x1bA' + bytes((int(n.group(1)),)))
 
     def page_length(self, length):
         """Specifies page length. This command is only valid with continuous length labels.
@@ -227,10 +343,8 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Length must be less than 12000.
         """
-        mH = length // 256
-        mL = length % 256
         if length < 12000:
-            self.send(chr(27) + '(' + 'C' + chr(2) + chr(0) + chr(mL) + chr(mH))
+            self.send(b'\x1b(C\x02\x00' + _WORD.pack(length))
         else:
             raise RuntimeError('Length must be less than 12000.')
 
@@ -245,12 +359,8 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Top margin must be less than the bottom margin.
         """
-        tL = topmargin % 256
-        tH = topmargin // 256
-        BL = bottommargin % 256
-        BH = topmargin / 256
-        if (tL + tH * 256) < (BL + BH * 256):
-            self.send(chr(27) + '(' + 'c' + chr(4) + chr(0) + chr(tL) + chr(tH) + chr(BL) + chr(BH))
+        if topmargin < bottommargin:
+            self.send(b'\x1b(c\x04\x00' + _TWO_WORDS.pack(topmargin, bottommargin))
         else:
             raise RuntimeError('The top margin must be less than the bottom margin')
 
@@ -265,7 +375,7 @@ class BrotherPrint(object):
             RuntimeError: Invalid margin parameter.
         """
         if margin <= 255 and margin >= 0:
-            self.send(chr(27) + 'I' + chr(margin))
+            self.send(b'\x1bI' + bytes((margin,)))
         else:
             raise RuntimeError('Invalid margin parameter.')
 
@@ -280,7 +390,7 @@ class BrotherPrint(object):
             RuntimeError: Invalid margin parameter
         """
         if margin >= 1 and margin <= 255:
-            self.send(chr(27) + 'Q' + chr(margin))
+            self.send(b'\x1bQ' + bytes((margin,)))
         else:
             raise RuntimeError('Invalid margin parameter in function rightMargin')
 
@@ -296,15 +406,12 @@ class BrotherPrint(object):
             RuntimeError: Too many positions.
         """
         if positions == 'clear':
-            self.send(chr(27) + 'D' + chr(0))
+            self.send(CLEAR_HORZ_TABS)
             return
-        if positions.min < 1 or positions.max > 255:
+        if min(positions) < 1 or max(positions) > 255:
             raise RuntimeError('Invalid position parameter in function horzTabPos')
-        sendstr = chr(27) + 'D'
         if len(positions) < 32:
-            for position in positions:
-                sendstr += chr(position)
-            self.send(sendstr + chr(0))
+            self.send(b'\x1bD' + bytes(positions) + b'\x00')
         else:
             raise RuntimeError('Too many positions in function horzTabPos')
 
@@ -320,15 +427,12 @@ class BrotherPrint(object):
             RuntimeError: Too many positions.
         """
         if positions == 'clear':
-            self.send(chr(27) + 'B' + chr(0))
+            self.send(CLEAR_VERT_TABS)
             return
-        if positions.min < 1 or positions.max > 255:
-            raise RuntimeError('Invalid position parameter in function horzTabPos')
-        sendstr = chr(27) + 'D'
+        if min(positions) < 1 or max(positions) > 255:
+            raise RuntimeError('Invalid position parameter in function vertTabPos')
         if len(positions) <= 16:
-            for position in positions:
-                sendstr += chr(position)
-            self.send(sendstr + chr(0))
+            self.send(b'\x1bB' + bytes(positions) + b'\x00')
         else:
             raise RuntimeError('Too many positions in function vertTabPos')
 
@@ -339,15 +443,139 @@ class BrotherPrint(object):
         """Sends text to printer
 
         Args:
-            text: string to be printed
+            text: bytes, or a string encoded as latin-1
+        Returns:
+            None
+        Raises:
+            RuntimeError: Text with characters outside latin-1."""
+        if self.buffering:
+            self.buffer += to_bytes(text)
+        else:
+            self._write(to_bytes(text))
+
+    def _write(self, data):
+        """Writes data to the interface in a single transfer.
+
+        On USB, a writer (transfer.ChunkedWriter) set by USBPrinter splits the transfer in packet
+        aligned chunks with flow control, it alone decides the chunking.
+
+        Args:
+            data: bytes-like object to be written
         Returns:
             None
         Raises:
             None"""
         if self.interface_type == self.WIFI_INTERFACE:
-            self.interface.send(text)
+            self.interface.send(data)
+            self.writes += 1
+        elif self.writer is not None:
+            self.writes += self.writer.write(data)
         else:  # USB_INTERFACE
-            self.ep.write(text)
+            self.ep.write(data)
+            self.writes += 1
+        self.bytes_written += len(data)
+
+    def bytes_sent(self):
+        """Bytes of the last transfer that may have reached the printer, also when it failed.
+
+        Args:
+            None
+        Returns:
+            Number of bytes, None when the interface does not tell
+        Raises:
+            None
+        """
+        if self.interface_type == self.WIFI_INTERFACE:
+            return getattr(self.interface, 'sent', None)
+        if self.writer is not None:
+            return self.writer.sent
+        return None
+
+    def begin_job(self):
+        """Starts buffering commands, nothing is written until flush() or end_job() is called.
+
+        Jobs can be nested, only the outermost end_job() writes the buffer.
+
+        Args:
+            None
+        Returns:
+            None
+        Raises:
+            None
+        """
+        if not self.job_depth:
+            del self.buffer[:]
+        self.job_depth += 1
+        self.buffering = True
+
+    def flush(self):
+        """Writes every buffered command with one transfer and empties the buffer.
+
+        Args:
+            None
+        Returns:
+            Number of bytes written
+        Raises:
+            None
+        """
+        size = len(self.buffer)
+        if size:
+            self._write(bytes(self.buffer))
+            del self.buffer[:]
+        return size
+
+    def end_job(self):
+        """Flushes the buffer and goes back to sending each command immediately.
+
+        Args:
+            None
+        Returns:
+            Number of bytes written
+        Raises:
+            None
+        """
+        self.job_depth = max(0, self.job_depth - 1)
+        if self.job_depth:
+            return 0
+        try:
+            return self.flush()
+        finally:
+            self.buffering = False
+
+    def discard_job(self):
+        """Drops the buffered commands without sending them.
+
+        Args:
+            None
+        Returns:
+            None
+        Raises:
+            None
+        """
+        del self.buffer[:]
+        self.buffering = False
+        self.job_depth = 0
+
+    @contextmanager
+    def job(self):
+        """Context manager buffering every command of a label and sending them in one transfer on exit.
+
+        If the block raises, the buffered commands are discarded so no partial label is printed.
+
+        Args:
+            None
+        Returns:
+            None
+        Raises:
+            None
+        """
+        self.begin_job()
+        try:
+            yield self
+        except BaseException:
+            self.discard_job()
+            raise
+        self.end_job()
 
     def forward_feed(self, amount):
         """Calling this function finishes input of the current line, then moves the vertical
@@ -362,7 +590,7 @@ class BrotherPrint(object):
             RuntimeError: Invalid foward feed.
         """
         if amount <= 255 and amount >= 0:
-            self.send(chr(27) + 'J' + chr(amount))
+            self.send(b'\x1bJ' + bytes((amount,)))
         else:
             raise RuntimeError('Invalid forward feed, must be less than 255 and >= 0')
 
@@ -376,10 +604,8 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid vertical position.
         """
-        mL = amount % 256
-        mH = amount // 256
         if amount < 32767 and amount > 0:
-            self.send(chr(27) + '(' + 'V' + chr(2) + chr(0) + chr(mL) + chr(mH))
+            self.send(b'\x1b(V\x02\x00' + _WORD.pack(amount))
         else:
             raise RuntimeError('Invalid vertical position in function absVertPos')
 
@@ -395,9 +621,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        n1 = amount % 256
-        n2 = amount // 256
-        self.send(chr(27) + '${n1}{n2}'.format(n1=n1, n2=n2))
+        self.send(b'\x1b$' + _WORD.pack(amount))
 
     def rel_horz_pos(self, amount):
         """Calling this function sets the relative horizontal position for the next data, this is
@@ -413,9 +637,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        n1 = amount % 256
-        n2 = amount // 256
-        self.send(chr(27) + '\{n1}{n2}'.format(n1=n1, n2=n2))
+        self.send(b'\x1b\\' + _WORD.pack(amount))
 
     def alignment(self, align):
         """Sets the alignment of the printer.
@@ -428,17 +650,9 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid alignment.
         """
-        if align == 'left':
-            align = '0'
-        elif align == 'center':
-            align = '1'
-        elif align == 'right':
-            align = '2'
-        elif align == 'justified':
-            align = '3'
-        else:
+        if align not in self.ALIGNMENTS:
             raise RuntimeError('Invalid alignment in function alignment')
-        self.send(chr(27) + 'a' + align)
+        self.send(self.ALIGNMENTS[align])
 
     def carriage_return(self):
         """Performs a line feed amount, sets next print position to the beginning of the next line,
@@ -451,7 +665,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(13))
+        self.send(CARRIAGE_RETURN)
 
     def line_feed(self):
         """Performs line feed operation, any carriage return command subsequent to a lineFeed will
@@ -464,7 +678,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(10))
+        self.send(LINE_FEED)
 
     def page_feed(self):
         """Page feed.
@@ -476,7 +690,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(12))
+        self.send(PAGE_FEED)
 
     def print_page(self, cut):
         """End input, set cut setting, and pagefeed.
@@ -501,10 +715,8 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid action.
         """
-        choices = {'on': '1',
-                   'off': '0'}
-        if action in choices:
-            self.send(chr(27) + 'if' + choices[action])
+        if action in self.FRAMES:
+            self.send(self.FRAMES[action])
         else:
             raise RuntimeError('Invalid action for function frame, choices are on and off')
 
@@ -518,7 +730,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(9))
+        self.send(HORZ_TAB)
 
     def vert_tab(self):
         """Applies vertical tab to nearest vertical tab position
@@ -530,7 +742,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(11))
+        self.send(VERT_TAB)
 
     ###########################################################################
     # Text Operations
@@ -545,13 +757,9 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid action.
         """
-        if action == 'on':
-            action = 'E'
-        elif action == 'off':
-            action = 'F'
-        else:
+        if action not in self.BOLD:
             raise RuntimeError('Invalid action for function bold. Options are on and off')
-        self.send(chr(27) + action)
+        self.send(self.BOLD[action])
 
     def italic(self, action):
         """Enable/cancel italic printing
@@ -563,13 +771,9 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid action.
         """
-        if action == 'on':
-            action = '4'
-        elif action == 'off':
-            action = '5'
-        else:
+        if action not in self.ITALIC:
             raise RuntimeError('Invalid action for function italic. Options are on and off')
-        self.send(chr(27) + action)
+        self.send(self.ITALIC[action])
 
     def double_strike(self, action):
         """Enable/cancel doublestrike printing
@@ -581,13 +785,9 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid action.
         """
-        if action == 'on':
-            action = 'G'
-        elif action == 'off':
-            action = 'H'
-        else:
+        if action not in self.DOUBLE_STRIKE:
             raise RuntimeError('Invalid action for function doubleStrike. Options are on and off')
-        self.send(chr(27) + action)
+        self.send(self.DOUBLE_STRIKE[action])
 
     def double_width(self, action):
         """Enable/cancel doublewidth printing
@@ -599,13 +799,9 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid action.
         """
-        if action == 'on':
-            action = '1'
-        elif action == 'off':
-            action = '0'
-        else:
+        if action not in self.DOUBLE_WIDTH:
             raise RuntimeError('Invalid action for function doubleWidth. Options are on and off')
-        self.send(chr(27) + 'W' + action)
+        self.send(self.DOUBLE_WIDTH[action])
 
     def compressed_char(self, action):
         """Enable/cancel compressed character printing
@@ -617,29 +813,23 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid action.
         """
-        if action == 'on':
-            action = 15
-        elif action == 'off':
-            action = 18
-        else:
+        if action not in self.COMPRESSED_CHAR:
             raise RuntimeError('Invalid action for function compressedChar. Options are on and off')
-        self.send(chr(action))
+        self.send(self.COMPRESSED_CHAR[action])
 
     def underline(self, action):
         """Enable/cancel underline printing
 
         Args:
-            action -- Enable or disable underline printing. Options are '1' - '4' and 'cancel'
+            action -- Enable or disable underline printing. Options are '1' - '4' and 'off'
         Returns:
             None
         Raises:
-            None
+            RuntimeError: Invalid action.
         """
-        if action == 'off':
-            action = '0'
-            self.send(chr(27) + chr(45) + action)
-        else:
-            self.send(chr(27) + chr(45) + action)
+        if action not in self.UNDERLINE:
+            raise RuntimeError('Invalid action for function underline.')
+        self.send(self.UNDERLINE[action])
 
     def char_size(self, size):
         """Changes font size
@@ -655,38 +845,12 @@ class BrotherPrint(object):
             Warning: Your font is currently set to outline and you have selected a bitmap only font size
             Warning: Your font is currently set to bitmap and you have selected an outline only font size
         """
-        sizes = {'24': 0,
-                 '32': 0,
-                 '48': 0,
-                 '33': 0,
-                 '38': 0,
-                 '42': 0,
-                 '46': 0,
-                 '50': 0,
-                 '58': 0,
-                 '67': 0,
-                 '75': 0,
-                 '83': 0,
-                 '92': 0,
-                 '100': 0,
-                 '117': 0,
-                 '133': 0,
-                 '150': 0,
-                 '167': 0,
-                 '200': 0,
-                 '233': 0,
-                 '11': 1,
-                 '44': 1,
-                 '77': 1,
-                 '111': 1,
-                 '144': 1
-                 }
-        if size in sizes:
-            if size in ['24', '32', '48'] and self.fonttype != self.font_types['bitmap']:
+        if size in self.CHAR_SIZES:
+            if size in self.BITMAP_SIZES and self.fonttype != self.font_types['bitmap']:
                 raise Warning('Your font is currently set to outline and you have selected a bitmap only font size')
-            if size not in ['24', '32', '48'] and self.fonttype != self.font_types['outline']:
+            if size not in self.BITMAP_SIZES and self.fonttype != self.font_types['outline']:
                 raise Warning('Your font is currently set to bitmap and you have selected an outline only font size')
-            self.send(chr(27) + 'X' + chr(0) + chr(int(size)) + chr(sizes[size]))
+            self.send(self.CHAR_SIZES[size])
         else:
             raise RuntimeError('Invalid size for function charSize, choices are auto 4pt 6pt 9pt 12pt 18pt and 24pt')
 
@@ -712,22 +876,13 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid font.
         """
-        fonts = {'brougham': 0,
-                 'lettergothicbold': 1,
-                 'brusselsbit': 2,
-                 'helsinkibit': 3,
-                 'sandiego': 4,
-                 'lettergothic': 9,
-                 'brusselsoutline': 10,
-                 'helsinkioutline': 11}
-
-        if font in fonts:
-            if font in ['broughham', 'lettergothicbold', 'brusselsbit', 'helsinkibit', 'sandiego']:
+        if font in self.FONTS:
+            if font in self.BITMAP_FONTS:
                 self.fonttype = self.font_types['bitmap']
             else:
                 self.fonttype = self.font_types['outline']
 
-            self.send(chr(27) + 'k' + chr(fonts[font]))
+            self.send(self.FONTS[font])
         else:
             raise RuntimeError('Invalid font in function selectFont')
 
@@ -741,13 +896,8 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid character style
         """
-        styleset = {'normal': 0,
-                    'outline': 1,
-                    'shadow': 2,
-                    'outlineshadow': 3
-                    }
-        if style in styleset:
-            self.send(chr(27) + 'q' + chr(styleset[style]))
+        if style in self.CHAR_STYLES:
+            self.send(self.CHAR_STYLES[style])
         else:
             raise RuntimeError('Invalid character style in function charStyle')
 
@@ -761,7 +911,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(27) + 'P')
+        self.send(PICA_PITCH)
 
     def elite_pitch(self):
         """Print subsequent data with elite pitch (12 char/inch)
@@ -773,7 +923,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(27) + 'M')
+        self.send(ELITE_PITCH)
 
     def micron_pitch(self):
         """Print subsequent data with micron pitch (15 char/inch)
@@ -785,7 +935,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(27) + 'g')
+        self.send(MICRON_PITCH)
 
     def proportional_char(self, action):
         """Specifies proportional characters. When turned on, the character spacing set
@@ -798,11 +948,8 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid action.
         """
-        actions = {'off': 0,
-                   'on': 1
-                   }
-        if action in actions:
-            self.send(chr(27) + 'p' + action)
+        if action in self.PROPORTIONAL:
+            self.send(self.PROPORTIONAL[action])
         else:
             raise RuntimeError('Invalid action in function proportionalChar')
 
@@ -817,7 +964,7 @@ class BrotherPrint(object):
             RuntimeError: Invalid dot amount.
         """
         if dots in range(0, 127):
-            self.send(chr(27) + chr(32) + chr(dots))
+            self.send(b'\x1b ' + bytes((dots,)))
         else:
             raise RuntimeError('Invalid dot amount in function charSpacing')
 
@@ -849,55 +996,13 @@ class BrotherPrint(object):
                             must be an even number b/w 2 and 20.
         """
 
-        barcodes = {'code39': b'0',
-                    'itf': b'1',
-                    'ean8/upca': b'5',
-                    'upce': b'6',
-                    'codabar': b'9',
-                    'code128': b'a',
-                    'gs1-128': b'b',
-                    'rss': b'c'}
-
-        widths = {'xsmall': b'0',
-                  'small': b'1',
-                  'medium': b'2',
-                  'large': b'3'}
-
-        ratios = {'3:1': b'0',
-                  '2.5:1': b'1',
-                  '2:1': b'2'}
-
-        rss_symbols = {'rss14std': b'0',
-                       'rss14trun': b'1',
-                       'rss14stacked': b'2',
-                       'rss14stackedomni': b'3',
-                       'rsslimited': b'4',
-                       'rssexpandedstd': b'5',
-                       'rssexpandedstacked': b'6'
-                       }
-
-        character_choices = {'off': b'0',
-                             'on': b'1'}
-        parentheses_choices = {'off': b'1',
-                               'on': b'0'}
-        equalize_choices = {'off': b'0',
-                            'on': b'1'}
-
-        sendstr = b''
-        n2 = height // 256
-        n1 = height % 256
-        if (format in barcodes and width in widths and ratio in ratios and characters in character_choices
-                and rss_symbol in rss_symbols):
-            sendstr += (
-                    chr(27).encode() + b'it' + barcodes[format] + b'spr' + character_choices[characters] +
-                    b'uxyh' + chr(n1).encode() + chr(n2).encode() + b'w' + widths[width] + b'e' +
-                    parentheses_choices[parentheses] + b'o' + rss_symbols[rss_symbol] + b'c' +
-                    chr(horiz_char_rss).encode() +
-                    b'z' + ratios[ratio] + b'f' + equalize_choices[equalize] + b'b' + data + chr(92).encode()
-            )
-            if format in ['code128', 'gs1-128']:
-                sendstr += chr(92).encode() + chr(92).encode()
-            self.send(sendstr)
+        if (format in self.BARCODE_FORMATS and width in self.BARCODE_WIDTHS and ratio in self.BARCODE_RATIOS
+                and characters in self.BARCODE_CHARACTERS and rss_symbol in self.BARCODE_RSS_SYMBOLS):
+            self.send(b''.join((
+                self.BARCODE_FORMATS[format], self.BARCODE_CHARACTERS[characters], _WORD.pack(height),
+                self.BARCODE_WIDTHS[width], self.BARCODE_PARENTHESES[parentheses], self.BARCODE_RSS_SYMBOLS[rss_symbol],
+                b'c', bytes((horiz_char_rss,)), self.BARCODE_RATIOS[ratio], self.BARCODE_EQUALIZE[equalize],
+                to_bytes(data), CODE128_END if format in ('code128', 'gs1-128') else BARCODE_END)))
         else:
             raise RuntimeError('Invalid parameters')
 
@@ -911,39 +1016,13 @@ class BrotherPrint(object):
             data: the barcode data
         """
 
-        size_choices = {'Prints 4 dots': 4,
-                        'Prints 6 dots': 6,
-                        'Prints 8 dots': 8,
-                        'Prints 10 dots': 10,
-                        'Prints 12 dots': 12}
-
-        model_type_choices = {'MODEL1': 1,
-                              'MODEL2': 2,
-                              'Micro QR': 3}
-
-        correction_choices = {'High-density level L': 1,
-                              'Standard level M': 2,
-                              'High-reliability level': 3,
-                              'Ultra-high-reliability level': 4
-                              }
-
-        if size in size_choices and model_type in model_type_choices and correction in correction_choices:
-            s = size_choices[size]
-            m = model_type_choices[model_type]
-            c = correction_choices[correction]
-            file_str = BytesIO()
-            file_str.write(b'\x1B')
-            file_str.write(b'iQ')
-            file_str.write(hex(s).encode())
-            file_str.write(hex(m).encode())
-            file_str.write(b'\x00\x00\x00\x00')
-            file_str.write(hex(c).encode())
-            file_str.write(b'\x00')
-            file_str.write(data)
-            file_str.write(chr(92).encode())
-            file_str.write(chr(92).encode())
-            file_str.write(chr(92).encode())
-            self.send(file_str.getvalue())
+        if (size in self.QRCODE_SIZES and model_type in self.QRCODE_MODELS
+                and correction in self.QRCODE_CORRECTIONS):
+            # cell size, model, no structured append (4 bytes), error correction, automatic input
+            self.send(b''.join((
+                b'\x1biQ', bytes((self.QRCODE_SIZES[size], self.QRCODE_MODELS[model_type], 0, 0, 0, 0,
+                                  self.QRCODE_CORRECTIONS[correction], 0)),
+                to_bytes(data), QRCODE_END)))
         else:
             raise RuntimeError('Invalid parameters')
 
@@ -961,7 +1040,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send('^FF')
+        self.send(TEMPLATE_PRINT)
 
     def choose_template(self, template):
         """Choose a template
@@ -973,9 +1052,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        n1 = int(template) // 10
-        n2 = int(template) % 10
-        self.send('^TS' + '0' + str(n1) + str(n2))
+        self.send(b'^TS%03d' % int(template))
 
     def machine_op(self, operation):
         """Perform machine operations
@@ -987,13 +1064,8 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid operation
         """
-        operations = {'feed2start': 1,
-                      'feedone': 2,
-                      'cut': 3
-                      }
-
-        if operation in operations:
-            self.send('^' + 'O' + 'P' + chr(operations[operation]))
+        if operation in self.MACHINE_OPS:
+            self.send(self.MACHINE_OPS[operation])
         else:
             raise RuntimeError('Invalid operation.')
 
@@ -1007,7 +1079,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send(chr(94) + chr(73) + chr(73))
+        self.send(TEMPLATE_INIT)
 
     def print_start_trigger(self, type):
         """Set print start trigger.
@@ -1019,12 +1091,8 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Invalid type.
         """
-        types = {'received': 1,
-                 'filled': 2,
-                 'num_received': 3}
-
-        if type in types:
-            self.send('^PT' + chr(types[type]))
+        if type in self.PRINT_START_TRIGGERS:
+            self.send(self.PRINT_START_TRIGGERS[type])
         else:
             raise RuntimeError('Invalid type.')
 
@@ -1038,12 +1106,11 @@ class BrotherPrint(object):
         Raises:
             RuntimeError: Command too long.
         """
+        command = to_bytes(command)
         size = len(command)
         if size > 20:
             raise RuntimeError('Command too long')
-        n1 = size // 10
-        n2 = size % 10
-        self.send('^PS' + chr(n1) + chr(n2) + command)
+        self.send(b'^PS' + bytes((size // 10, size % 10)) + command)
 
     def received_char_count(self, count):
         """Set received char count limit
@@ -1055,10 +1122,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        n1 = count // 100
-        n2 = (count - (n1 * 100)) // 10
-        n3 = (count - ((n1 * 100) + (n2 * 10)))
-        self.send('^PC' + chr(n1) + chr(n2) + chr(n3))
+        self.send(b'^PC' + bytes((count // 100, count // 10 % 10, count % 10)))
 
     def select_delim(self, delim):
         """Select desired delimiter
@@ -1073,9 +1137,7 @@ class BrotherPrint(object):
         size = len(delim)
         if size > 20:
             raise RuntimeError('Delimiter too long')
-        n1 = size // 10
-        n2 = size % 10
-        self.send('^SS' + chr(n1) + chr(n2))
+        self.send(b'^SS' + bytes((size // 10, size % 10)))
 
     def select_obj(self, name):
         """Select an object
@@ -1087,7 +1149,7 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        self.send('^ON' + name + chr(0))
+        self.send(b'^ON' + to_bytes(name) + b'\x00')
 
     def insert_into_obj(self, data):
         """Insert text into selected object.
@@ -1099,13 +1161,8 @@ class BrotherPrint(object):
         Raises:
             None
         """
-        if not data:
-            data = ''
-        size = len(data)
-        n1 = size % 256
-        n2 = size // 256
-
-        self.send('^DI' + chr(n1) + chr(n2) + data)
+        data = to_bytes(data or b'')
+        self.send(b'^DI' + _WORD.pack(len(data)) + data)
 
     def select_and_insert(self, name, data):
         """Combines selection and data insertion into one function
@@ -1120,3 +1177,24 @@ class BrotherPrint(object):
         """
         self.select_obj(name)
         self.insert_into_obj(data)
+
+    def template_records(self, template, records):
+        """Print one label per record with a template stored on the printer.
+
+        The template is selected once, then each record only sends its object data and a print command.
+
+        Args:
+            template: number of the template stored on the printer
+            records: list of dicts mapping object name to the data to insert
+        Returns:
+            None
+        Raises:
+            None
+        """
+        self.template_mode()
+        self.template_init()
+        self.choose_template(template)
+        for record in records:
+            for name, data in record.items():
+                self.select_and_insert(name, data)
+            self.template_print()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Host side text rendering for raster labels
+
+Description:
+Glyphs are rasterized once per font and size into a GlyphAtlas, strings are then assembled by
+copying glyph bitmaps into a NumPy array with slicing. Rendered strings are cached too, so a
+line repeated on every label, like the company name, is only composed once.
+"""
+from collections import OrderedDict
+from threading import Lock
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = ImageDraw = ImageFont = None
+
+
+class LRUCache(object):
+    """ Small bounded mapping dropping the least recently used entries """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+        return value
+
+    def stats(self):
+        return {'size': len(self.items), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+def load_font(font=None, size=24):
+    """Loads a TrueType font, the Pillow default font when font is None"""
+    if ImageFont is None or np is None:
+        raise RuntimeError('Text rendering requires numpy and Pillow.')
+    if font is None:
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:
+            # Pillow < 10.1 only has the fixed size bitmap font
+            return ImageFont.load_default()
+    return ImageFont.truetype(font, size)
+
+
+class GlyphAtlas(object):
+    """ Bitmaps of the glyphs of one font and size, rasterized on first use """
+
+    def __init__(self, font=None, size=24):
+        self.font = load_font(font, size)
+        ascent, descent = self.font.getmetrics()
+        self.height = ascent + descent
+        self.glyphs = {}
+
+    def glyph(self, char):
+        """ (bool bitmap, x offset, y offset, advance) of a character """
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            glyph = self.glyphs[char] = self._rasterize(char)
+        return glyph
+
+    def _rasterize(self, char):
+        font = self.font
+        advance = int(round(font.getlength(char))) if hasattr(font, 'getlength') else font.getsize(char)[0]
+        x0, y0, x1, y1 = font.getbbox(char)
+        if x1 <= x0 or y1 <= y0:
+            return np.zeros((0, 0), dtype=np.bool_), 0, 0, advance
+        image = Image.new('L', (x1 - x0, y1 - y0), 0)
+        ImageDraw.Draw(image).text((-x0, -y0), char, font=font, fill=255)
+        return np.asarray(image) > 127, x0, y0, advance
+
+
+class TextCompositor(object):
+    """ Renders strings into bool arrays (True is a printed dot) from cached glyph atlases """
+
+    def __init__(self, font=None, atlas_size=8, string_size=256):
+        """
+        @param font        : TrueType font path, Pillow default font when None
+        @param atlas_size  : number of font sizes kept rasterized
+        @param string_size : number of rendered strings kept
+        """
+        self.font = font
+        self.atlases = LRUCache(atlas_size)
+        self.strings = LRUCache(string_size)
+
+    def atlas(self, size):
+        atlas = self.atlases.get(size)
+        if atlas is None:
+            atlas = self.atlases.put(size, GlyphAtlas(self.font, size))
+        return atlas
+
+    def render(self, text, size=24):
+        """Bitmap of one line of text, height is the font line height.
+
+        The returned array is shared by the string cache and must not be modified.
+        """
+        key = (size, text)
+        bitmap = self.strings.get(key)
+        if bitmap is not None:
+            return bitmap
+        atlas = self.atlas(size)
+        glyphs = [atlas.glyph(char) for char in text]
+        width = sum(glyph[3] for glyph in glyphs)
+        # glyphs can overhang their advance, leave room for the last one
+        if glyphs:
+            width += max(0, glyphs[-1][1] + glyphs[-1][0].shape[1] - glyphs[-1][3])
+        bitmap = np.zeros((atlas.height, max(width, 1)), dtype=np.bool_)
+        x = 0
+        for bits, x0, y0, advance in glyphs:
+            if bits.size:
+                top, left = max(0, y0), max(0, x + x0)
+                bits = bits[top - y0:, left - x - x0:]
+                height = min(bits.shape[0], atlas.height - top)
+                width = min(bits.shape[1], bitmap.shape[1] - left)
+                bitmap[top:top + height, left:left + width] |= bits[:height, :width]
+            x += advance
+        bitmap.flags.writeable = False
+        return self.strings.put(key, bitmap)
+
+    def compose(self, lines, size=24, spacing=4, align='center'):
+        """Stacks several lines of text, or ready bitmaps, into one label bitmap.
+
+        Args:
+            lines: list of strings or 2D bool arrays
+            size: font size of the strings
+            spacing: dots between two lines
+            align: 'left', 'center' or 'right'
+        Returns:
+            numpy.ndarray of bool
+        Raises:
+            RuntimeError: Invalid alignment.
+        """
+        if align not in ('left', 'center', 'right'):
+            raise RuntimeError('Invalid alignment.')
+        bitmaps = [self.render(line, size) if isinstance(line, str) else np.asarray(line, dtype=np.bool_)
+                   for line in lines]
+        if not bitmaps:
+            return np.zeros((1, 1), dtype=np.bool_)
+        height = sum(bitmap.shape[0] for bitmap in bitmaps) + spacing * (len(bitmaps) - 1)
+        width = max(bitmap.shape[1] for bitmap in bitmaps)
+        label = np.zeros((height, width), dtype=np.bool_)
+        y = 0
+        for bitmap in bitmaps:
+            h, w = bitmap.shape
+            x = {'left': 0, 'center': (width - w) // 2, 'right': width - w}[align]
+            label[y:y + h, x:x + w] = bitmap
+            y += h + spacing
+        return label
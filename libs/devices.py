@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import logging
+from threading import Lock
+
+BANNED_DEVICES = [
+    "0424:9514",  # Standard Microsystem Corp. Builtin Ethernet module
+    "1d6b:0002",  # Linux Foundation 2.0 root hub
+    "1d6b:0001",  # Linux Foundation 1.0 root hub
+    "0424:ec00",  # Standard Microsystem Corp. Other Builtin Ethernet module
+]
+
+# if no printer class device is found we take the first brother, epson or star device
+FALLBACK_VENDORS = [0x04f9, 0x04b8, 0x0519]
+
+_logger = logging.getLogger(__name__)
+
+
+def load_usb():
+    """Imports pyusb on first use, so importing the driver does not load the USB stack.
+
+    Returns:
+        the usb package, None when pyusb is not installed
+    """
+    try:
+        import usb.core
+        import usb.util
+    except ImportError:
+        return None
+    return usb
+
+
+class FindUsbClass(object):
+    """ printers can either define bDeviceClass=7, or they can define one of
+    their interfaces with bInterfaceClass=7. This class checks for both. """
+
+    def __init__(self, usb_class):
+        self._class = usb_class
+
+    def __call__(self, device):
+        # first, let's check the device
+        if device.bDeviceClass == self._class:
+            return True
+        # transverse all devices and look through their interfaces to
+        # find a matching class
+        usb = load_usb()
+        for cfg in device:
+            intf = usb.util.find_descriptor(cfg, bInterfaceClass=self._class)
+
+            if intf is not None:
+                return True
+
+        return False
+
+
+class UsbDeviceIndex(object):
+    """ Cache of the printers found on the USB bus.
+
+    The bus is only walked again when a lookup misses or after invalidate(),
+    descriptors and string names are read once per device.
+    """
+
+    def __init__(self, banned=BANNED_DEVICES, backend=None):
+        """
+        @param banned  : list of "vendor:product" hex ids to ignore
+        @param backend : pyusb backend, the libusb1 backend is loaded once when None
+        """
+        self.banned = set(banned)
+        self._backend = backend
+        self._entries = None
+        self._names = {}
+        self.lock = Lock()
+        self.refresh_count = 0
+
+    @staticmethod
+    def device_id(vendor, product):
+        return '%04x:%04x' % (vendor, product)
+
+    def backend(self):
+        if self._backend is None:
+            try:
+                import usb.backend.libusb1
+                self._backend = usb.backend.libusb1.get_backend()
+            except ImportError:
+                self._backend = None
+        return self._backend
+
+    def invalidate(self):
+        with self.lock:
+            self._entries = None
+
+    def devices(self):
+        """ Return the cached printer list, walking the bus only if it was invalidated """
+        entries = self._entries
+        if entries is None:
+            entries = self.refresh()
+        return entries
+
+    def lookup(self, vendor=None, product=None, bus=None, address=None, key=None):
+        """ Return the first cached printer matching the given ids, refresh once on a miss """
+        count = self.refresh_count
+        for refresh in (False, True):
+            if refresh and self.refresh_count != count:
+                # devices() already walked the bus
+                break
+            entries = self.refresh() if refresh else self.devices()
+            for entry in entries:
+                if ((key is None or entry['key'] == key)
+                        and (vendor is None or entry['vendor'] == vendor)
+                        and (product is None or entry['product'] == product)
+                        and (bus is None or entry['bus'] == bus)
+                        and (address is None or entry['address'] == address)):
+                    return entry
+        return None
+
+    def refresh(self):
+        with self.lock:
+            self.refresh_count += 1
+            found = [device for device in self._find(custom_match=FindUsbClass(7))
+                     if not self._banned(device)]
+            for vendor in FALLBACK_VENDORS:
+                if found:
+                    break
+                found = [device for device in self._find(idVendor=vendor) if not self._banned(device)]
+            entries = []
+            for device in found:
+                entry = self._entry(device)
+                if entry is not None:
+                    entries.append(entry)
+            self._entries = entries
+            return entries
+
+    def _find(self, **kwargs):
+        usb = load_usb()
+        if usb is None:
+            raise RuntimeError('USB printing requires pyusb.')
+        return list(usb.core.find(find_all=True, backend=self.backend(), **kwargs) or [])
+
+    def _banned(self, device):
+        return self.device_id(device.idVendor, device.idProduct) in self.banned
+
+    def _entry(self, device):
+        base_key = (device.bus, device.address, device.idVendor, device.idProduct)
+        cached = self._names.get(base_key)
+        if cached is None:
+            usb = load_usb()
+            device._langids = (1033,)
+            try:
+                name = (usb.util.get_string(device, device.iManufacturer) + " " +
+                        usb.util.get_string(device, device.iProduct))
+                serial = usb.util.get_string(device, device.iSerialNumber) if device.iSerialNumber else None
+            except usb.core.USBError as usb_error:
+                _logger.warning("resource Busy " + str(usb_error))
+                if 'Resource busy' in str(usb_error):
+                    if device.is_kernel_driver_active(0):
+                        device.detach_kernel_driver(0)
+                        device.set_configuration()
+                return None
+            cached = self._names[base_key] = (name, serial)
+        name, serial = cached
+        return {
+            'key': base_key + (serial,),
+            'vendor': device.idVendor,
+            'product': device.idProduct,
+            'bus': device.bus,
+            'address': device.address,
+            'serial': serial,
+            'name': name,
+            'device': device,
+        }
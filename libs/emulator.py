@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""PT-9700 emulator
+
+Description:
+Parses the command stream produced by this library (ESC/P, raster and P-touch template mode),
+counts the labels it would print, models the time the printer needs for them and answers
+ESC i S with a status block. It can stand in for the printer as a fake USB printer or a TCP
+endpoint on the raw port, to load test without burning tape.
+"""
+import logging
+import socketserver
+import time
+from collections import deque
+from threading import Lock, Thread
+
+from .brotherprint import BrotherPrint, to_bytes
+from .transfer import ChunkedWriter
+from .status import ERRORS_1, ERRORS_2, STATUS_REQUEST, STATUS_SIZE, decode_status
+
+_logger = logging.getLogger(__name__)
+
+ESC = 0x1b
+
+# ESC <command>: number of parameter bytes
+ESC_PARAMS = {ord('@'): 0, ord('R'): 1, ord('t'): 1, ord('a'): 1, ord('J'): 1, ord('W'): 1, ord('-'): 1,
+              ord('E'): 0, ord('F'): 0, ord('4'): 0, ord('5'): 0, ord('G'): 0, ord('H'): 0, ord('P'): 0,
+              ord('M'): 0, ord('g'): 0, ord('I'): 1, ord('Q'): 1, ord('$'): 2, ord('\\'): 2, ord('p'): 1,
+              ord(' '): 1, ord('k'): 1, ord('q'): 1, ord('X'): 3, ord('0'): 0, ord('2'): 0, ord('3'): 1,
+              ord('A'): 1}
+# ESC i <command>: number of parameter bytes
+ESC_I_PARAMS = {ord('a'): 1, ord('S'): 0, ord('C'): 1, ord('L'): 1, ord('f'): 1, ord('z'): 10, ord('M'): 1,
+                ord('K'): 1, ord('d'): 2, ord('A'): 1, ord('U'): 15, ord('!'): 1}
+# ESC i t parameters: letter -> number of value bytes, 'b' starts the data
+BARCODE_PARAMS = {ord('s'): 0, ord('p'): 0, ord('u'): 0, ord('x'): 0, ord('y'): 0, ord('r'): 1, ord('h'): 2,
+                  ord('w'): 1, ord('e'): 1, ord('o'): 1, ord('c'): 1, ord('z'): 1, ord('f'): 1}
+# ^XX template commands with a fixed number of parameter bytes
+TEMPLATE_PARAMS = {b'II': 0, b'TS': 3, b'FF': 0, b'OP': 1, b'PT': 1, b'PC': 3, b'SS': 2}
+
+MODES = {0x00: 'escp', 0x30: 'escp', 0x01: 'raster', 0x31: 'raster', 0x03: 'template', 0x33: 'template'}
+
+DOTS_PER_MM = 360 / 25.4
+
+
+class PrinterEmulator(object):
+    """ Emulated PT-9700 fed with the bytes the library sends.
+
+    With realtime set, feed() sleeps when the printer would be more than
+    max_backlog seconds behind, like a real printer not reading its input.
+    """
+
+    def __init__(self, tape_width=24, media_type=0x01, speed=80.0, cut_time=0.5, label_length=30.0,
+                 template_length=30.0, realtime=False, time_scale=1.0, max_backlog=2.0, model=0x67):
+        """
+        @param tape_width      : loaded tape width in mm, reported in the status
+        @param media_type      : media type byte reported in the status
+        @param speed           : print speed in mm/s
+        @param cut_time        : seconds per cut
+        @param label_length    : length in mm of an ESC/P label
+        @param template_length : length in mm of a template label
+        @param realtime        : block feed() when the emulated printer falls behind
+        @param time_scale      : factor applied to the modelled print time
+        @param max_backlog     : seconds of printing accepted ahead when realtime
+        @param model           : model code reported in the status
+        """
+        self.tape_width = tape_width
+        self.media_type = media_type
+        self.speed = speed
+        self.cut_time = cut_time
+        self.label_length = label_length
+        self.template_length = template_length
+        self.realtime = realtime
+        self.time_scale = time_scale
+        self.max_backlog = max_backlog
+        self.model = model
+        self.lock = Lock()
+        self.replies = deque()
+        self.reset()
+
+    def reset(self):
+        self.buffer = bytearray()
+        self.mode = 'escp'
+        self.cut = 0x01
+        self.raster_lines = 0
+        self.template_fields = {}
+        self.template_object = b''
+        self.busy_until = 0.0
+        self.faults = set()
+        self.stats = {'bytes': 0, 'commands': 0, 'labels': 0, 'cuts': 0, 'barcodes': 0, 'qrcodes': 0,
+                      'raster_lines': 0, 'template_prints': 0, 'text_bytes': 0, 'unknown': 0,
+                      'status_requests': 0, 'parse_errors': 0, 'feed_mm': 0.0, 'print_seconds': 0.0}
+
+    ###########################################################################
+    # Interface
+    ###########################################################################
+
+    def feed(self, data):
+        """ Parse bytes sent to the printer, return the number of bytes accepted """
+        data = to_bytes(data)
+        with self.lock:
+            self.stats['bytes'] += len(data)
+            self.buffer += data
+            consumed = 0
+            while consumed < len(self.buffer):
+                size = self._command(consumed)
+                if size is None:
+                    break
+                consumed += size
+                self.stats['commands'] += 1
+            del self.buffer[:consumed]
+            backlog = self.busy_until - time.monotonic()
+        if self.realtime and backlog > self.max_backlog:
+            time.sleep(backlog - self.max_backlog)
+        return len(data)
+
+    def read(self, size=STATUS_SIZE):
+        """ Next reply of the printer, empty when there is none """
+        with self.lock:
+            if not self.replies:
+                return b''
+            reply = self.replies.popleft()
+            if len(reply) > size:
+                self.replies.appendleft(reply[size:])
+            return reply[:size]
+
+    def printing(self):
+        return time.monotonic() < self.busy_until
+
+    def set_fault(self, error, active=True):
+        """ Raise or clear an error reported in the status, a name of ERRORS_1 or ERRORS_2 """
+        if error not in ERRORS_1 and error not in ERRORS_2:
+            raise RuntimeError('Invalid error.')
+        if active:
+            self.faults.add(error)
+        else:
+            self.faults.discard(error)
+
+    def status_block(self):
+        block = bytearray(STATUS_SIZE)
+        block[0:4] = b'\x80\x20B0'
+        block[4] = self.model
+        block[5] = 0x30
+        for error in self.faults:
+            if error in ERRORS_1:
+                block[8] |= 1 << ERRORS_1.index(error)
+            else:
+                block[9] |= 1 << ERRORS_2.index(error)
+        # 3.5 mm tape is reported as 4
+        block[10] = 4 if self.tape_width == 3.5 else int(self.tape_width)
+        block[11] = self.media_type
+        block[15] = {'escp': 0x00, 'raster': 0x01, 'template': 0x03}[self.mode]
+        block[18] = 0x02 if self.faults else 0x00
+        block[19] = 0x01 if self.printing() else 0x00
+        return bytes(block)
+
+    def status(self):
+        return decode_status(self.status_block())
+
+    ###########################################################################
+    # Parser, each method returns the size of the command or None if incomplete
+    ###########################################################################
+
+    def _command(self, i):
+        buf = self.buffer
+        byte = buf[i]
+        if byte == ESC:
+            return self._escape(i)
+        if self.mode == 'raster':
+            return self._raster(i)
+        if self.mode == 'template':
+            return self._template(i)
+        if byte == 0x0c:
+            self._label(self.label_length)
+        elif byte >= 0x20 or byte in (0x0a, 0x0d, 0x09, 0x0b):
+            self.stats['text_bytes'] += byte >= 0x20
+        elif byte not in (0x0f, 0x12, 0x00):
+            self.stats['unknown'] += 1
+        return 1
+
+    def _escape(self, i):
+        buf = self.buffer
+        if len(buf) < i + 2:
+            return None
+        command = buf[i + 1]
+        if command == ord('i'):
+            return self._escape_i(i)
+        if command == ord('@'):
+            self.cut = 0x01
+            return 2
+        if command in (ord('D'), ord('B')):
+            end = buf.find(b'\x00', i + 2)
+            return None if end < 0 else end - i + 1
+        if command == ord('('):
+            if len(buf) < i + 5:
+                return None
+            size = 5 + (buf[i + 3] | buf[i + 4] << 8)
+            return size if len(buf) >= i + size else None
+        if command in ESC_PARAMS:
+            size = 2 + ESC_PARAMS[command]
+            return size if len(buf) >= i + size else None
+        self.stats['unknown'] += 1
+        return 2
+
+    def _escape_i(self, i):
+        buf = self.buffer
+        if len(buf) < i + 3:
+            return None
+        command = buf[i + 2]
+        if command == ord('t'):
+            return self._barcode(i)
+        if command == ord('Q'):
+            end = buf.find(b'\\\\\\', i + 3)
+            if end < 0:
+                return None
+            self.stats['qrcodes'] += 1
+            return end - i + 3
+        if command not in ESC_I_PARAMS:
+            self.stats['unknown'] += 1
+            return 3
+        size = 3 + ESC_I_PARAMS[command]
+        if len(buf) < i + size:
+            return None
+        value = buf[i + 3] if size > 3 else None
+        if command == ord('a'):
+            self.mode = MODES.get(value, self.mode)
+        elif command == ord('S'):
+            self.stats['status_requests'] += 1
+            self.replies.append(self.status_block())
+        elif command == ord('C'):
+            self.cut = value
+        elif command == ord('z'):
+            self.raster_lines = 0
+        return size
+
+    def _barcode(self, i):
+        buf = self.buffer
+        # ESC i t <type>
+        j = i + 4
+        if len(buf) < j:
+            return None
+        barcode_type = buf[i + 3]
+        while True:
+            if len(buf) <= j:
+                return None
+            letter = buf[j]
+            if letter == ord('b'):
+                break
+            if letter not in BARCODE_PARAMS:
+                self.stats['parse_errors'] += 1
+                return j - i
+            j += 1 + BARCODE_PARAMS[letter]
+        end = buf.find(b'\\', j + 1)
+        if end < 0:
+            return None
+        end += 1
+        if barcode_type in (ord('a'), ord('b')):
+            # code128 and gs1-128 data ends with three backslashes
+            if len(buf) < end + 2:
+                return None
+            end += 2
+        self.stats['barcodes'] += 1
+        return end - i
+
+    def _raster(self, i):
+        buf = self.buffer
+        byte = buf[i]
+        if byte in (ord('G'), ord('g')):
+            if len(buf) < i + 3:
+                return None
+            size = 3 + (buf[i + 1] | buf[i + 2] << 8)
+            if len(buf) < i + size:
+                return None
+            self.raster_lines += 1
+            self.stats['raster_lines'] += 1
+            return size
+        if byte == ord('Z'):
+            self.raster_lines += 1
+            self.stats['raster_lines'] += 1
+            return 1
+        if byte == ord('M'):
+            return 2 if len(buf) >= i + 2 else None
+        if byte in (0x0c, 0x1a):
+            self._label(self.raster_lines / DOTS_PER_MM)
+            self.raster_lines = 0
+            return 1
+        if byte != 0x00:
+            self.stats['unknown'] += 1
+        return 1
+
+    def _template(self, i):
+        buf = self.buffer
+        if buf[i] != ord('^'):
+            self.stats['unknown'] += buf[i] != 0x00
+            return 1
+        if len(buf) < i + 3:
+            return None
+        command = bytes(buf[i + 1:i + 3])
+        if command == b'ON':
+            end = buf.find(b'\x00', i + 3)
+            if end < 0:
+                return None
+            self.template_object = bytes(buf[i + 3:end])
+            return end - i + 1
+        if command == b'DI':
+            if len(buf) < i + 5:
+                return None
+            size = 5 + (buf[i + 3] | buf[i + 4] << 8)
+            if len(buf) < i + size:
+                return None
+            self.template_fields[self.template_object] = bytes(buf[i + 5:i + size])
+            return size
+        if command == b'PS':
+            if len(buf) < i + 5:
+                return None
+            return 5 + buf[i + 3] * 10 + buf[i + 4]
+        if command not in TEMPLATE_PARAMS:
+            self.stats['unknown'] += 1
+            return 3
+        size = 3 + TEMPLATE_PARAMS[command]
+        if len(buf) < i + size:
+            return None
+        if command == b'FF':
+            self.stats['template_prints'] += 1
+            self._label(self.template_length)
+        return size
+
+    def _label(self, length):
+        """ A page was printed: add its feed and cut time to the printer schedule """
+        cut = self.cut in (0x01, 0x02)
+        seconds = (length / self.speed + (self.cut_time if cut else 0)) * self.time_scale
+        now = time.monotonic()
+        self.busy_until = max(now, self.busy_until) + seconds
+        self.stats['labels'] += 1
+        self.stats['cuts'] += cut
+        self.stats['feed_mm'] += length
+        self.stats['print_seconds'] += seconds
+
+
+class EmulatedEndpoint(object):
+    """ pyusb endpoint replacement backed by a PrinterEmulator """
+
+    def __init__(self, emulator, address, max_packet_size=512):
+        self.emulator = emulator
+        self.bEndpointAddress = address
+        self.wMaxPacketSize = max_packet_size
+
+    def write(self, data, timeout=None):
+        return self.emulator.feed(data)
+
+    def read(self, size, timeout=None):
+        return self.emulator.read(size)
+
+
+class EmulatedUSBPrinter(object):
+    """ Drop-in replacement of USBPrinter printing on a PrinterEmulator """
+
+    def __init__(self, emulator=None, **kwargs):
+        self.emulator = emulator if emulator is not None else PrinterEmulator(**kwargs)
+        self.out_ep = EmulatedEndpoint(self.emulator, 0x02)
+        self.in_ep = EmulatedEndpoint(self.emulator, 0x81)
+        self.device = self.emulator
+        self.printer = BrotherPrint(self.device, self.out_ep, BrotherPrint.USB_INTERFACE)
+        # jobs go through the same chunked transfer as on a USBPrinter
+        self.printer.writer = ChunkedWriter(self.out_ep, self.in_ep)
+
+    def get_printer_status(self):
+        self.out_ep.write(STATUS_REQUEST)
+        return decode_status(self.in_ep.read(STATUS_SIZE))
+
+    def close(self):
+        return True
+
+
+class _EmulatorHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        emulator = self.server.emulator
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                break
+            emulator.feed(data)
+            reply = emulator.read(65536)
+            if reply:
+                self.request.sendall(reply)
+
+
+class EmulatorServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """ Raw port TCP endpoint in front of a PrinterEmulator, port 0 picks a free port """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=9100, emulator=None, **kwargs):
+        self.emulator = emulator if emulator is not None else PrinterEmulator(**kwargs)
+        socketserver.TCPServer.__init__(self, (host, port), _EmulatorHandler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        thread = Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Idempotency keys
+
+Description:
+Remembers the keys of recently pushed jobs so a client retrying a request does not print the
+label twice. Keys live in a dict for O(1) lookups and in an insertion ordered ring of
+(expiry, key) used to forget them after the window, or earlier when more than maxsize keys are
+kept, so memory stays bounded whatever the number of keys per day.
+"""
+import time
+from collections import deque
+from threading import Lock
+
+QUEUED = 'queued'
+TRANSMITTED = 'transmitted'
+
+
+class IdempotencyIndex(object):
+    """ Time windowed set of idempotency keys with the job and state of each one """
+
+    def __init__(self, window=86400, maxsize=1000000):
+        """
+        @param window  : seconds a key is remembered
+        @param maxsize : maximum number of keys, the oldest are forgotten first
+        """
+        self.window = window
+        self.maxsize = maxsize
+        # key -> [expiry, job id, state, future of the job until it finishes]
+        self.entries = {}
+        self.ring = deque()
+        self.lock = Lock()
+        self.duplicates = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _expire(self, now):
+        ring, entries = self.ring, self.entries
+        while ring and (ring[0][0] <= now or len(ring) > self.maxsize):
+            expiry, key = ring.popleft()
+            record = entries.get(key)
+            # the key may have been released and claimed again since
+            if record is not None and record[0] == expiry:
+                del entries[key]
+
+    def claim(self, key, job_id, future=None):
+        """Registers a key for a new job.
+
+        Args:
+            key: hashable idempotency key
+            job_id: id of the job pushed with the key
+            future: future of the job, kept until settle() or release() so duplicates can follow it
+        Returns:
+            None if the key is new, else the [expiry, job id, state, future] record of the first job
+        Raises:
+            None
+        """
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            record = self.entries.get(key)
+            if record is not None:
+                self.duplicates += 1
+                return list(record)
+            expiry = now + self.window
+            self.entries[key] = [expiry, job_id, QUEUED, future]
+            self.ring.append((expiry, key))
+            if len(self.ring) > self.maxsize:
+                self._expire(now)
+            return None
+
+    def mark_transmitted(self, key):
+        """ The job bytes of key were written to the printer """
+        with self.lock:
+            record = self.entries.get(key)
+            if record is not None:
+                record[2] = TRANSMITTED
+
+    def settle(self, key):
+        """ The job of key finished, its future is no longer needed """
+        with self.lock:
+            record = self.entries.get(key)
+            if record is not None:
+                record[3] = None
+
+    def release(self, key):
+        """ Forget a key whose job was never transmitted, so it can be pushed again """
+        with self.lock:
+            record = self.entries.get(key)
+            if record is None:
+                return
+            if record[2] != TRANSMITTED:
+                del self.entries[key]
+            else:
+                record[3] = None
+
+    def state(self, key):
+        """ 'queued', 'transmitted' or None for an unknown or expired key """
+        with self.lock:
+            self._expire(time.monotonic())
+            record = self.entries.get(key)
+            return record[2] if record is not None else None
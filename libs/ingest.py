@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Streaming label ingestion
+
+Description:
+Reads a CSV or JSONL export lazily, maps its columns to label fields and pushes the rows to a
+BrotherDriver (or PrinterPool) as batch jobs of chunk_size labels. At most max_pending chunks are
+in flight, so memory does not grow with the file. The number of rows confirmed printed can be
+written to a checkpoint file after every chunk to resume an interrupted run.
+"""
+import csv
+import io
+import json
+import logging
+import os
+from collections import deque
+from itertools import islice
+
+_logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl')
+
+# label field -> column, used when no mapping is given
+DEFAULT_MAPPING = {'label': 'label', 'data': 'data', 'company': 'company'}
+
+
+def detect_format(path):
+    """ 'csv' or 'jsonl' from the file extension """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(source, format=None, delimiter=','):
+    """Rows of a CSV or JSONL file as dicts, read one line at a time.
+
+    Args:
+        source: file path or open text file
+        format: 'csv' or 'jsonl', guessed from the file name when None
+        delimiter: CSV field delimiter
+    Returns:
+        generator of dict
+    Raises:
+        RuntimeError: Invalid format.
+    """
+    if format is None:
+        format = detect_format(source if isinstance(source, str) else getattr(source, 'name', ''))
+    if format not in FORMATS:
+        raise RuntimeError('Invalid ingestion format.')
+    if isinstance(source, str):
+        with io.open(source, newline='', encoding='utf-8') as stream:
+            for row in read_rows(stream, format, delimiter):
+                yield row
+        return
+    if format == 'csv':
+        for row in csv.DictReader(source, delimiter=delimiter):
+            yield row
+    else:
+        for line in source:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def map_rows(rows, mapping=None, defaults=None):
+    """Label dicts built from rows.
+
+    Args:
+        rows: iterable of dicts
+        mapping: {label field: column}, DEFAULT_MAPPING when None
+        defaults: {label field: value} for fields missing from the row or the mapping
+    Returns:
+        generator of dict
+    Raises:
+        RuntimeError: Missing column.
+    """
+    mapping = dict(mapping or DEFAULT_MAPPING)
+    defaults = dict(defaults or {})
+    for index, row in enumerate(rows):
+        label = dict(defaults)
+        for field, column in mapping.items():
+            value = row.get(column)
+            if value is None:
+                if field in defaults:
+                    continue
+                raise RuntimeError('Row %d has no column %s.' % (index, column))
+            label[field] = str(value)
+        yield label
+
+
+def chunked(iterable, size):
+    """ Lists of up to size items """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_checkpoint(path):
+    """ Row offset stored by write_checkpoint(), 0 if there is none """
+    try:
+        with open(path) as stream:
+            return int(stream.read().strip() or 0)
+    except (IOError, OSError, ValueError):
+        return 0
+
+
+def write_checkpoint(path, offset):
+    """ Atomically replaces the checkpoint file with offset """
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as stream:
+        stream.write('%d\n' % offset)
+    os.replace(temporary, path)
+
+
+class Ingestion(object):
+    """ Feeds the labels of an export file to a driver with bounded memory """
+
+    def __init__(self, driver, task='barcode', chunk_size=50, max_pending=4, cut='chain', cut_every=None,
+                 template=None, checkpoint=None):
+        """
+        @param driver      : BrotherDriver or PrinterPool
+        @param task        : 'barcode', 'qrcode', or 'template' to fill a template stored on the printer
+        @param chunk_size  : labels per job
+        @param max_pending : jobs pushed and not printed yet before reading more rows
+        @param cut         : cut between the labels of a chunk, 'chain', 'half' or 'full'
+        @param cut_every   : full cut after every cut_every labels
+        @param template    : template number, for the 'template' task
+        @param checkpoint  : file where the offset of the last printed row is kept
+        """
+        if task not in ('barcode', 'qrcode', 'template'):
+            raise RuntimeError('Invalid ingestion task.')
+        if task == 'template' and template is None:
+            raise RuntimeError('The template task needs a template number.')
+        if chunk_size < 1 or max_pending < 1:
+            raise RuntimeError('chunk_size and max_pending must be at least 1.')
+        self.driver = driver
+        self.task = task
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending
+        self.cut = cut
+        self.cut_every = cut_every
+        self.template = template
+        self.checkpoint = checkpoint
+        self.offset = 0
+        self.pending = deque()
+
+    def push(self, labels):
+        if self.task == 'template':
+            return self.driver.push_task('template', {'template': self.template, 'records': labels})
+        return self.driver.push_batch(self.task, labels, cut=self.cut, cut_every=self.cut_every)
+
+    def confirm(self):
+        """ Wait for the oldest chunk in flight and move the offset past it """
+        handle, size = self.pending.popleft()
+        handle.result()
+        self.offset += size
+        if self.checkpoint is not None:
+            write_checkpoint(self.checkpoint, self.offset)
+
+    def run(self, labels, start=0):
+        """Prints labels, skipping the first start ones.
+
+        Chunks finish in order, the offset only moves past a chunk once it is printed. If a chunk
+        fails, the chunks already pushed after it may still print and are printed again on resume.
+
+        Args:
+            labels: iterable of label dicts, e.g. from map_rows()
+            start: number of labels already printed by an earlier run
+        Returns:
+            number of labels printed, including start
+        Raises:
+            Exception: the error of the first failed chunk.
+        """
+        self.offset = start
+        for chunk in chunked(islice(labels, start, None), self.chunk_size):
+            if len(self.pending) >= self.max_pending:
+                self.confirm()
+            self.pending.append((self.push(chunk), len(chunk)))
+        while self.pending:
+            self.confirm()
+        _logger.info('ingestion done, %d labels' % self.offset)
+        return self.offset
+
+
+def ingest(driver, source, task='barcode', mapping=None, defaults=None, format=None, start=None, **options):
+    """Prints every row of a CSV or JSONL file.
+
+    Args:
+        driver: BrotherDriver or PrinterPool
+        source: file path or open text file
+        task: 'barcode', 'qrcode' or 'template'
+        mapping: {label field: column}
+        defaults: {label field: value} for constant fields
+        format: 'csv' or 'jsonl', guessed from the file name when None
+        start: rows to skip, read from the checkpoint option when None
+        options: Ingestion options
+    Returns:
+        number of rows printed, including start
+    Raises:
+        RuntimeError: Invalid parameters or missing column.
+    """
+    ingestion = Ingestion(driver, task, **options)
+    if start is None:
+        start = read_checkpoint(ingestion.checkpoint) if ingestion.checkpoint else 0
+    if task == 'template' and mapping is None:
+        # template objects are named after the columns
+        labels = (dict(defaults or {}, **row) for row in read_rows(source, format))
+    else:
+        labels = map_rows(read_rows(source, format), mapping, defaults)
+    return ingestion.run(labels, start)
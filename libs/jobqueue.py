@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import time
+from collections import deque
+from concurrent.futures import Future
+from queue import Empty, Full
+from threading import Condition, Lock
+
+# lower values are served first, like queue.PriorityQueue
+PRIORITY_STATUS = -100
+PRIORITY_HIGH = -10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = 10
+# BrotherDriver.stop(), after any print work
+PRIORITY_STOP = 1000
+
+FULL_POLICIES = ('block', 'reject', 'drop-oldest')
+
+_job_ids = itertools.count(1)
+
+
+class PrintJob(object):
+    """ A task waiting in the JobQueue """
+    __slots__ = ('id', 'task', 'data', 'timestamp', 'priority', 'deadline', 'late', 'attempts', 'future',
+                 'state', 'timings', 'entry', 'rendered', 'key', 'transmitted', 'partial')
+
+    def __init__(self, task, data=None, priority=PRIORITY_NORMAL, deadline=None, timestamp=None):
+        """
+        @param task      : task name, e.g. 'barcode'
+        @param data      : task data
+        @param priority  : lower values are printed first
+        @param deadline  : time.time() after which the job is late, None for no deadline
+        @param timestamp : enqueue time, now when None
+        """
+        self.id = next(_job_ids)
+        self.task = task
+        self.data = data
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.priority = priority
+        self.deadline = deadline
+        self.late = False
+        self.attempts = 0
+        self.future = Future()
+        # queued, running, retrying, done, failed or cancelled
+        self.state = 'queued'
+        self.timings = {}
+        # queue entry, cleared when the job leaves the queue
+        self.entry = None
+        # Future of the job bytes when a RenderPool encodes the job
+        self.rendered = None
+        # idempotency key, and whether the job bytes were written to the printer
+        self.key = None
+        self.transmitted = False
+        # the transfer failed after a label of the job reached the printer, it must not be sent again
+        self.partial = False
+
+    def follow(self, future):
+        """ Resolve this job like future, the job pushed first with the same key on another driver """
+        def copy(source):
+            if source.cancelled():
+                self.future.cancel()
+            elif source.exception() is not None:
+                self.future.set_exception(source.exception())
+            else:
+                self.future.set_result(source.result())
+        future.add_done_callback(copy)
+
+    def expired(self, now=None):
+        return self.deadline is not None and (now or time.time()) > self.deadline
+
+    def add_timing(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+
+class JobHandle(object):
+    """ What push_task returns: the job id and a future-like view of the job """
+
+    def __init__(self, job, driver):
+        self.job = job
+        self.driver = driver
+
+    def __repr__(self):
+        return '<JobHandle %d %s %s>' % (self.job.id, self.job.task, self.job.state)
+
+    @property
+    def id(self):
+        return self.job.id
+
+    @property
+    def future(self):
+        return self.job.future
+
+    @property
+    def status(self):
+        return self.job.state
+
+    @property
+    def timings(self):
+        """ Seconds spent in queue_wait, discovery, open, encode, transfer and close """
+        return dict(self.job.timings)
+
+    def cancel(self):
+        """ Remove the job from the queue, False if it is already running or finished """
+        return self.driver.cancel(self.job.id)
+
+    def cancelled(self):
+        return self.job.state == 'cancelled'
+
+    def done(self):
+        return self.job.future.done()
+
+    def result(self, timeout=None):
+        return self.job.future.result(timeout)
+
+    def exception(self, timeout=None):
+        return self.job.future.exception(timeout)
+
+    def add_done_callback(self, fn):
+        self.job.future.add_done_callback(lambda future: fn(self))
+
+
+class JobQueue(object):
+    """ Heap based job queue ordered by priority, then deadline, then enqueue order.
+
+    The queue holds at most maxsize jobs (0 for no limit), full_policy decides
+    what put() does when it is full: 'block' waits for room, 'reject' raises
+    queue.Full and 'drop-oldest' removes the oldest job to make room.
+    Jobs given back with requeue() wait for their delay in a second heap and do
+    not need room, they were already admitted.
+    pause() holds every job but the status probes for a while, e.g. while the
+    printer is unplugged, without taking them out of the queue.
+
+    Records how long every job waited so the tail latency can be checked with
+    wait_percentiles().
+    """
+
+    def __init__(self, maxsize=0, full_policy='block', wait_samples=1024):
+        """
+        @param maxsize      : maximum number of queued jobs, 0 for no limit
+        @param full_policy  : 'block', 'reject' or 'drop-oldest'
+        @param wait_samples : number of recent queue waits kept for wait_percentiles()
+        """
+        if full_policy not in FULL_POLICIES:
+            raise RuntimeError('Invalid full queue policy.')
+        self.maxsize = maxsize
+        self.full_policy = full_policy
+        # entries are [priority, deadline, seq, job], job is None once removed
+        self.heap = []
+        self.order = deque()
+        self.delayed = []
+        self.paused_until = 0.0
+        self.size = 0
+        self.counter = itertools.count()
+        self.lock = Lock()
+        self.not_empty = Condition(self.lock)
+        self.not_full = Condition(self.lock)
+        self.waits = deque(maxlen=wait_samples)
+
+    def qsize(self):
+        return self.size
+
+    def empty(self):
+        return not self.size
+
+    def full(self):
+        return 0 < self.maxsize <= self.size
+
+    def put(self, job, block=True, timeout=None):
+        """ Add a job, return the job dropped to make room if any.
+        block=False only matters to the 'block' policy: raise queue.Full instead of waiting """
+        dropped = None
+        with self.not_full:
+            if self.full():
+                if self.full_policy == 'reject' or (self.full_policy == 'block' and not block):
+                    raise Full
+                elif self.full_policy == 'drop-oldest':
+                    dropped = self._drop_oldest()
+                elif timeout is None:
+                    while self.full():
+                        self.not_full.wait()
+                else:
+                    endtime = time.monotonic() + timeout
+                    while self.full():
+                        remaining = endtime - time.monotonic()
+                        if remaining <= 0.0:
+                            raise Full
+                        self.not_full.wait(remaining)
+            self._push(job)
+        return dropped
+
+    def requeue(self, job, delay=0):
+        """ Give back a job that will be served again after delay seconds """
+        with self.not_empty:
+            if delay > 0:
+                job.entry = [time.monotonic() + delay, next(self.counter), job]
+                heapq.heappush(self.delayed, job.entry)
+                self.size += 1
+                self.not_empty.notify()
+            else:
+                self._push(job)
+
+    def pause(self, seconds):
+        """ Serve only status probes for the next seconds """
+        with self.not_empty:
+            self.paused_until = time.monotonic() + seconds
+
+    def resume(self):
+        with self.not_empty:
+            self.paused_until = 0.0
+            self.not_empty.notify_all()
+
+    def drain(self):
+        """ Remove and return every job, queued or waiting for its retry delay """
+        with self.not_full:
+            jobs = []
+            for entry in self.heap + self.delayed:
+                job = entry[-1]
+                if job is not None:
+                    entry[-1] = None
+                    job.entry = None
+                    jobs.append(job)
+            self.heap, self.delayed, self.order = [], [], deque()
+            self.size = 0
+            self.not_full.notify_all()
+        return jobs
+
+    def remove(self, job):
+        """ Remove a queued job in O(1), its entry is skipped when it reaches the top of its heap """
+        with self.not_full:
+            entry = job.entry
+            if entry is None or entry[-1] is not job:
+                return False
+            entry[-1] = None
+            job.entry = None
+            self.size -= 1
+            self.not_full.notify()
+            return True
+
+    def get(self, block=True, timeout=None):
+        """ Remove and return the most urgent job, raise queue.Empty on timeout """
+        with self.not_empty:
+            endtime = time.monotonic() + timeout if timeout is not None else None
+            while True:
+                self._promote()
+                now = time.monotonic()
+                paused = self.paused_until > now
+                job = self._pop(PRIORITY_STATUS if paused else None)
+                if job is not None:
+                    break
+                if not block:
+                    raise Empty
+                wait = self.delayed[0][0] - now if self.delayed else None
+                if paused:
+                    wait = self.paused_until - now if wait is None else min(wait, self.paused_until - now)
+                if endtime is not None:
+                    remaining = endtime - time.monotonic()
+                    if remaining <= 0.0:
+                        raise Empty
+                    wait = remaining if wait is None else min(wait, remaining)
+                self.not_empty.wait(wait)
+            self.not_full.notify()
+        wait = time.time() - job.timestamp
+        self.waits.append(wait)
+        job.timings['queue_wait'] = wait
+        return job
+
+    def wait_percentiles(self, percentiles=(50, 90, 99)):
+        """ Queue wait in seconds of the recent jobs for each requested percentile """
+        waits = sorted(self.waits)
+        if not waits:
+            return dict((p, None) for p in percentiles)
+        last = len(waits) - 1
+        return dict((p, waits[min(last, int(round(p / 100.0 * last)))]) for p in percentiles)
+
+    def _push(self, job):
+        deadline = job.deadline if job.deadline is not None else float('inf')
+        entry = job.entry = [job.priority, deadline, next(self.counter), job]
+        heapq.heappush(self.heap, entry)
+        self.order.append(entry)
+        self.size += 1
+        self.not_empty.notify()
+
+    def _pop(self, max_priority=None):
+        heap = self.heap
+        while heap:
+            entry = heap[0]
+            job = entry[-1]
+            if job is not None and max_priority is not None and entry[0] > max_priority:
+                return None
+            heapq.heappop(heap)
+            if job is not None:
+                entry[-1] = None
+                job.entry = None
+                self.size -= 1
+                self._trim_order()
+                return job
+        return None
+
+    def _promote(self):
+        now = time.monotonic()
+        while self.delayed and self.delayed[0][0] <= now:
+            job = heapq.heappop(self.delayed)[-1]
+            if job is not None:
+                self.size -= 1
+                self._push(job)
+
+    def _drop_oldest(self):
+        while self.order:
+            entry = self.order.popleft()
+            job = entry[-1]
+            if job is not None:
+                entry[-1] = None
+                job.entry = None
+                self.size -= 1
+                return job
+        return None
+
+    def _trim_order(self):
+        # served entries are removed lazily from the insertion order, compact it
+        # when a long waiting job keeps too many of them behind it
+        order = self.order
+        while order and order[0][-1] is None:
+            order.popleft()
+        if len(order) > 2 * self.size + 64:
+            self.order = deque(entry for entry in order if entry[-1] is not None)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Compiled label programs
+
+Description:
+A label layout (task type plus its fixed options) is rendered once through BrotherPrint into a byte
+template with slots for the variable fields. Printing a label then only encodes the fields and joins
+them with the precomputed command bytes.
+"""
+from collections import OrderedDict
+from threading import Lock
+
+from .brotherprint import BrotherPrint, to_bytes
+
+
+def _utf8(value):
+    return value.encode('utf8')
+
+
+def _slot_marker(name):
+    return b'\x00\x1e' + name.encode('ascii') + b'\x1e\x00'
+
+
+def _recorder():
+    printer = BrotherPrint(None, None, BrotherPrint.USB_INTERFACE)
+    printer.begin_job()
+    return printer
+
+
+def _take(printer):
+    data = bytes(printer.buffer)
+    del printer.buffer[:]
+    return data
+
+
+def label_prologue(printer):
+    """Commands sent once before the labels of a job"""
+    printer.command_mode()
+    printer.initialize()
+    printer.compressed_char('on')
+    printer.alignment('center')
+
+
+def barcode_body(printer, label, height=125, format='code39', characters='on', equalize='on', width='xsmall',
+                 rss_symbol='rss14trun'):
+    printer.send(label['label'])
+    printer.line_feed()
+    printer.barcode(label['data'], format, characters=characters, height=height, equalize=equalize, width=width,
+                    rss_symbol=rss_symbol)
+    printer.line_feed()
+    printer.send(label['company'])
+
+
+def qrcode_body(printer, label, size='Prints 4 dots', model_type='MODEL2', correction='High-density level L'):
+    printer.send(label['label'])
+    printer.line_feed()
+    printer.qrcode(label['data'], size=size, model_type=model_type, correction=correction)
+
+
+# task -> (body renderer, slot encoders)
+LAYOUTS = {
+    'barcode': (barcode_body, (('label', to_bytes), ('data', _utf8), ('company', to_bytes))),
+    'qrcode': (qrcode_body, (('label', to_bytes), ('data', _utf8))),
+}
+
+_page_ends = {}
+
+
+def page_end(cut):
+    """Bytes of print_page(cut), cached per cut setting"""
+    data = _page_ends.get(cut)
+    if data is None:
+        printer = _recorder()
+        printer.print_page(cut)
+        data = _page_ends[cut] = _take(printer)
+    return data
+
+
+class LabelProgram(object):
+    """ Precomputed command bytes of a label layout with slots for its variable fields """
+
+    def __init__(self, prologue, parts, slots):
+        """
+        @param prologue : bytes sent once before the labels
+        @param parts    : list of bytes, None where a slot is filled in
+        @param slots    : list of (index in parts, field name, encoder)
+        """
+        self.prologue = prologue
+        self.parts = parts
+        self.slots = slots
+
+    @classmethod
+    def compile(cls, task, **options):
+        if task not in LAYOUTS:
+            raise RuntimeError('Unknown label layout: %s' % task)
+        body, encoders = LAYOUTS[task]
+        printer = _recorder()
+        label_prologue(printer)
+        prologue = _take(printer)
+
+        markers = dict((name, _slot_marker(name)) for name, encoder in encoders)
+        body(printer, markers, **options)
+        stream = _take(printer)
+
+        parts, slots = [], []
+        position = 0
+        found = sorted((stream.index(marker), name) for name, marker in markers.items())
+        for index, name in found:
+            parts.append(stream[position:index])
+            slots.append((len(parts), name, dict(encoders)[name]))
+            parts.append(None)
+            position = index + len(markers[name])
+        parts.append(stream[position:])
+        return cls(prologue, parts, slots)
+
+    def fill(self, label):
+        """Bytes of one label body, without prologue and page end"""
+        parts = list(self.parts)
+        for index, name, encoder in self.slots:
+            parts[index] = encoder(label[name])
+        return b''.join(parts)
+
+    def render(self, label, cut='full'):
+        """Bytes of a complete single label job"""
+        return self.prologue + self.fill(label) + page_end(cut)
+
+
+class LabelProgramCache(object):
+    """ Bounded LRU of compiled label programs keyed by layout """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.programs = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def layout_key(task, options):
+        return (task,) + tuple(sorted(options.items()))
+
+    def get(self, task, **options):
+        key = self.layout_key(task, options)
+        with self.lock:
+            program = self.programs.get(key)
+            if program is not None:
+                self.programs.move_to_end(key)
+                self.hits += 1
+                return program
+            self.misses += 1
+        program = LabelProgram.compile(task, **options)
+        with self.lock:
+            self.programs[key] = program
+            while len(self.programs) > self.maxsize:
+                self.programs.popitem(last=False)
+        return program
+
+    def clear(self):
+        with self.lock:
+            self.programs.clear()
+
+    def stats(self):
+        return {
+            'size': len(self.programs),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Driver metrics
+
+Description:
+Counters, gauges and histograms kept by BrotherDriver on its hot paths, exported as a dict
+snapshot or in the Prometheus text format. Updates take no lock and allocate nothing once a
+label set has been seen: labelled children are created on first use and reused afterwards,
+histogram buckets are a preallocated list. Values that already exist elsewhere, like the queue
+depth, are read by a function at collection time instead of being updated on every job.
+"""
+from bisect import bisect_left
+
+# seconds, from a USB write of a small label to a long raster job
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (64, 128, 256, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+# bytes/s, full speed USB tops out around 1 MB/s, high speed and TCP go further
+THROUGHPUT_BUCKETS = (10000, 50000, 100000, 250000, 500000, 1000000, 2500000, 5000000, 10000000, 40000000)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+    """ Base of the metric types, children hold the values of each label set """
+    type = None
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        """
+        @param name       : metric name, without the registry prefix
+        @param help       : description exported with the metric
+        @param labelnames : names of the labels, values are given to labels()
+        @param function   : callable returning the value at collection time, for unlabelled metrics
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self.children = {}
+        if not self.labelnames:
+            self.children[()] = self._child()
+
+    def labels(self, *values):
+        """ Child of a label set, keep it to update the metric without any lookup """
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise RuntimeError('Invalid labels for %s.' % self.name)
+            child = self.children.setdefault(values, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def collect(self):
+        """ [(label values, value)] """
+        if self.function is not None:
+            return [((), self.function())]
+        return [(values, child.get()) for values, child in list(self.children.items())]
+
+
+class _Value(object):
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.children[()].value += amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def _child(self):
+        return _Value()
+
+    def set(self, value):
+        self.children[()].value = value
+
+
+class _Buckets(object):
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get(self):
+        cumulative = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return {'buckets': list(zip(self.bounds + (float('inf'),), cumulative)), 'sum': self.sum, 'count': total}
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        Metric.__init__(self, name, help, labelnames)
+
+    def _child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+
+class MetricsRegistry(object):
+    """ Named metrics of a driver, exported with a common prefix """
+
+    def __init__(self, prefix='brother_'):
+        self.prefix = prefix
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise RuntimeError('Metric %s already registered.' % metric.name)
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=(), function=None):
+        return self.register(Counter(name, help, labelnames, function))
+
+    def gauge(self, name, help, labelnames=(), function=None):
+        return self.register(Gauge(name, help, labelnames, function))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def snapshot(self):
+        """Current values of every metric.
+
+        Args:
+            None
+        Returns:
+            dict of metric name -> value for unlabelled metrics, or -> {label values: value}
+        Raises:
+            None
+        """
+        snapshot = {}
+        for name, metric in self.metrics.items():
+            samples = metric.collect()
+            if not metric.labelnames:
+                snapshot[name] = samples[0][1]
+            else:
+                snapshot[name] = dict((values if len(values) > 1 else values[0], value)
+                                      for values, value in samples)
+        return snapshot
+
+    def prometheus(self):
+        """Every metric in the Prometheus text exposition format.
+
+        Args:
+            None
+        Returns:
+            str
+        Raises:
+            None
+        """
+        lines = []
+        for name, metric in self.metrics.items():
+            name = self.prefix + name
+            lines.append('# HELP %s %s' % (name, metric.help))
+            lines.append('# TYPE %s %s' % (name, metric.type))
+            for values, value in metric.collect():
+                if metric.type != 'histogram':
+                    lines.append('%s%s %s' % (name, _format_labels(metric.labelnames, values), _format_value(value)))
+                    continue
+                for bound, count in value['buckets']:
+                    labels = _format_labels(metric.labelnames, values, [('le', _format_value(bound))])
+                    lines.append('%s_bucket%s %d' % (name, labels, count))
+                labels = _format_labels(metric.labelnames, values)
+                lines.append('%s_sum%s %s' % (name, labels, _format_value(value['sum'])))
+                lines.append('%s_count%s %d' % (name, labels, value['count']))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+import logging
+import socket
+from threading import Lock, RLock
+
+from .brotherprint import BrotherPrint, to_bytes
+from .status import STATUS_REQUEST, STATUS_SIZE, decode_status
+
+RAW_PORT = 9100
+
+_logger = logging.getLogger(__name__)
+
+
+class TcpConnection(object):
+    """ Persistent connection to the raw port of a network printer.
+
+    Used as the interface of BrotherPrint in WiFi mode: send() writes a whole
+    job with one sendall (or one sendmsg for a list of buffers) and reconnects
+    once if the connection was dropped before any byte of the job was sent.
+    A connection may be shared by several drivers, hold lock to keep a request
+    and its reply together.
+    """
+
+    def __init__(self, host, port=RAW_PORT, timeout=10):
+        """
+        @param host    : printer address
+        @param port    : raw printing port
+        @param timeout : connect and send timeout in seconds
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.connect_count = 0
+        self.lock = RLock()
+        # bytes of the current send() accepted by the socket
+        self.sent = 0
+
+    def connect(self):
+        self.close()
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.sock = sock
+        self.connect_count += 1
+        return sock
+
+    def send(self, data):
+        """
+        @param data : bytes or str, or a list of them sent with a single scatter-gather call
+        """
+        if isinstance(data, (list, tuple)):
+            buffers = [to_bytes(part) for part in data]
+        else:
+            buffers = [to_bytes(data)]
+        with self.lock:
+            for attempt in (0, 1):
+                self.sent = 0
+                try:
+                    if self.sock is None:
+                        self.connect()
+                    self._sendmsg(buffers)
+                    return
+                except OSError as e:
+                    self.close()
+                    if attempt or self.sent:
+                        # part of the job may be printed already, resending it could print a label twice
+                        raise
+                    _logger.warning('connection to %s:%d lost, reconnecting: %s' % (self.host, self.port, e))
+
+    def _sendmsg(self, buffers):
+        """ Send every buffer, counting in self.sent the bytes the socket accepted """
+        views = [memoryview(buffer) for buffer in buffers if buffer]
+        sendmsg = getattr(self.sock, 'sendmsg', None)
+        if sendmsg is None and len(views) > 1:
+            views = [memoryview(b''.join(views))]
+        while views:
+            sent = sendmsg(views) if sendmsg is not None else self.sock.send(views[0])
+            self.sent += sent
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if views and sent:
+                views[0] = views[0][sent:]
+
+    def recv(self, size=32, timeout=None):
+        """
+        @param timeout : seconds to wait for this read, the connection timeout when None
+        """
+        if self.sock is None:
+            self.connect()
+        if timeout is None:
+            return self.sock.recv(size)
+        self.sock.settimeout(timeout)
+        try:
+            return self.sock.recv(size)
+        finally:
+            if self.sock is not None:
+                self.sock.settimeout(self.timeout)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+class TcpConnectionPool(object):
+    """ One persistent TcpConnection per printer, kept open between jobs """
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+        self.connections = {}
+        self.lock = Lock()
+
+    def get(self, host, port=RAW_PORT):
+        with self.lock:
+            connection = self.connections.get((host, port))
+            if connection is None:
+                connection = self.connections[(host, port)] = TcpConnection(host, port, self.timeout)
+            return connection
+
+    def discard(self, host, port=RAW_PORT):
+        with self.lock:
+            connection = self.connections.pop((host, port), None)
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        with self.lock:
+            connections, self.connections = list(self.connections.values()), {}
+        for connection in connections:
+            connection.close()
+
+
+_default_pool = TcpConnectionPool()
+
+
+class NetworkPrinter(object):
+    """ Define network printer, used by BrotherDriver like USBPrinter """
+
+    def __init__(self, host, port=RAW_PORT, pool=None, status_timeout=2.0):
+        """
+        @param host           : printer address
+        @param port           : raw printing port
+        @param pool           : TcpConnectionPool holding the connection, a shared one when None
+        @param status_timeout : seconds to wait for the status block, status polls hold the driver device lock
+        """
+        self.host = host
+        self.port = port
+        self.status_timeout = status_timeout
+        self.pool = pool if pool is not None else _default_pool
+        self.open()
+
+    def open(self):
+        self.device = self.pool.get(self.host, self.port)
+        # the connection is shared: another driver may be sending on it or connecting it right now
+        with self.device.lock:
+            if self.device.sock is None:
+                self.device.connect()
+        self.printer = BrotherPrint(self.device, None, BrotherPrint.WIFI_INTERFACE)
+
+    def get_printer_status(self):
+        """ Send ESC i S and return the decoded status block """
+        device = self.device
+        with device.lock:
+            device.send(STATUS_REQUEST)
+            raw = b''
+            try:
+                while len(raw) < STATUS_SIZE:
+                    chunk = device.recv(STATUS_SIZE - len(raw), self.status_timeout)
+                    if not chunk:
+                        raise IOError('Connection closed while reading status')
+                    raw += chunk
+            except OSError:
+                # a late reply would be read as the next status block
+                device.close()
+                raise
+        return decode_status(raw)
+
+    def close(self):
+        """ The connection stays open in the pool for the next session """
+        self.device = None
+        self.printer = None
+        return True
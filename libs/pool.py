@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from threading import Lock
+
+from .BrtotherDriver import BrotherDriver
+from .devices import UsbDeviceIndex
+from .idempotency import IdempotencyIndex
+
+_logger = logging.getLogger(__name__)
+
+
+class PrinterPool(object):
+    """ One BrotherDriver worker per connected printer.
+
+    Tasks go to the worker with the fewest outstanding labels, optionally
+    restricted to the workers tagged with the requested affinity. Workers whose
+    printer is missing are only used when no other worker is left. Besides the
+    configured tags every worker is tagged with the width of its loaded tape,
+    e.g. '24mm', as reported by its status monitor.
+    """
+
+    def __init__(self, idle_timeout=30, tags=None, devices=None, idempotency=None, refresh_interval=30,
+                 **driver_options):
+        """
+        @param idle_timeout     : passed to every worker
+        @param tags             : dict of device serial or name -> list of affinity tags
+        @param devices          : UsbDeviceIndex, shared by every worker
+        @param idempotency      : IdempotencyIndex, shared by every worker so a key is unique across printers
+        @param refresh_interval : seconds after which a task looks for printers plugged in since, None to only
+                                  add them with refresh()
+        @param driver_options   : other BrotherDriver arguments given to every worker, e.g. max_retries
+        """
+        self.idle_timeout = idle_timeout
+        self.tags = tags or {}
+        self.devices = devices if devices is not None else UsbDeviceIndex()
+        self.idempotency = idempotency if idempotency is not None else IdempotencyIndex()
+        self.refresh_interval = refresh_interval
+        self.driver_options = driver_options
+        self.last_refresh = None
+        self.workers = {}
+        self.lock = Lock()
+
+    def device_tags(self, entry):
+        return self.tags.get(entry['serial'], self.tags.get(entry['name'], ()))
+
+    def refresh(self):
+        """ Start a worker for every printer on the bus that does not have one yet, retire the workers of
+        printers no longer there. Their queued jobs move to the remaining workers, a worker is kept while it
+        is the only one left """
+        retired = []
+        with self.lock:
+            self.last_refresh = time.monotonic()
+            keys = set()
+            for entry in self.devices.refresh():
+                keys.add(entry['key'])
+                if entry['key'] in self.workers:
+                    continue
+                _logger.info('adding printer ' + entry['name'] + ' to pool')
+                self.workers[entry['key']] = BrotherDriver(
+                    self.idle_timeout, device=entry['key'], devices=self.devices, tags=self.device_tags(entry),
+                    idempotency=self.idempotency, **self.driver_options)
+            remaining = [worker for key, worker in self.workers.items() if key in keys]
+            if remaining:
+                for key in [key for key in self.workers if key not in keys]:
+                    _logger.info('removing printer %s from pool' % (key,))
+                    retired.append(self.workers.pop(key))
+            workers = list(self.workers.values())
+        for worker in retired:
+            for job in worker.hand_over():
+                min(remaining, key=lambda worker: worker.pending).adopt(job)
+            worker.stop()
+        return workers
+
+    def select(self, affinity=None):
+        workers = list(self.workers.values())
+        if not workers or (self.refresh_interval is not None
+                           and time.monotonic() - self.last_refresh > self.refresh_interval):
+            workers = self.refresh()
+        if not workers:
+            raise RuntimeError('Printer Not Found')
+        # an unplugged printer with nothing pending would otherwise win every time
+        workers = [worker for worker in workers if not worker.is_absent()] or workers
+        if affinity is not None:
+            matching = [worker for worker in workers if affinity in worker.affinity_tags()]
+            if matching:
+                workers = matching
+            else:
+                _logger.warning('no printer tagged %s, using any printer' % affinity)
+        return min(workers, key=lambda worker: worker.pending)
+
+    def push_task(self, task, data=None, affinity=None, priority=None, deadline=None, block=True, key=None):
+        worker = self.select(affinity)
+        return worker.push_task(task, data, priority=priority, deadline=deadline, block=block, key=key)
+
+    def push_batch(self, task, labels, cut='chain', cut_every=None, affinity=None, priority=None, deadline=None,
+                   block=True, key=None):
+        worker = self.select(affinity)
+        return worker.push_batch(task, labels, cut=cut, cut_every=cut_every, priority=priority, deadline=deadline,
+                                 block=block, key=key)
+
+    def get_status(self):
+        return dict((worker.device, worker.status) for worker in self.workers.values())
+
+    def get_metrics(self):
+        return dict((worker.device, worker.get_metrics()) for worker in self.workers.values())
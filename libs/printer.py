@@ -1,30 +1,37 @@
 # -*- coding: utf-8 -*-
-from .brotherprint import *
-import usb.core
-import usb.util
+from .brotherprint import BrotherPrint
+from .devices import load_usb
+from .status import STATUS_REQUEST, STATUS_SIZE, decode_status
+from .transfer import ChunkedWriter
 
 
 class USBPrinter(object):
     """ Define USB printer """
 
-    def __init__(self, idVendor, idProduct, interface=0, in_ep=0x82, out_ep=0x01):
+    def __init__(self, idVendor, idProduct, interface=0, in_ep=0x82, out_ep=0x01, device=None):
         """
         @param idVendor  : Vendor ID
         @param idProduct : Product ID
         @param interface : USB device interface
         @param in_ep     : Input end point
         @param out_ep    : Output end point
+        @param device    : already discovered usb.core.Device, skips the bus lookup
         """
         self.idVendor = idVendor
         self.idProduct = idProduct
         self.interface = interface
         self.in_ep = in_ep
         self.out_ep = out_ep
+        self.device = device
         self.open()
 
     def open(self):
         """ Search device on USB tree and set is as escpos device """
-        self.device = usb.core.find(idVendor=self.idVendor, idProduct=self.idProduct)
+        usb = load_usb()
+        if usb is None:
+            raise RuntimeError('USB printing requires pyusb.')
+        if self.device is None:
+            self.device = usb.core.find(idVendor=self.idVendor, idProduct=self.idProduct)
         if self.device is None:
             print("Cable isn't plugged in")
             return
@@ -60,8 +67,10 @@ class USBPrinter(object):
             print("no in end point")
         self.printer = BrotherPrint(
             self.device, self.out_ep, 'usb')
+        self.printer.writer = ChunkedWriter(self.out_ep, self.in_ep)
 
     def close(self):
+        usb = load_usb()
         i = 0
         while True:
             try:
@@ -78,54 +87,13 @@ class USBPrinter(object):
                 if i > 10:
                     return False
 
-    def __extract_status(self):
-        maxiterate = 0
-        rep = self.device.read(self.in_ep, 32, 10).tolist()
-        rep = bytes(self.in_ep.read(32))
-
-        return rep
+    def __extract_status(self, timeout=1000):
+        return bytes(self.in_ep.read(STATUS_SIZE, timeout))
 
     def get_printer_status(self):
-        status = {
-            'printer': {},
-            'offline': {},
-            'error': {},
-            'paper': {},
-        }
-
-        self.device.write(self.out_ep, b'\x1BSi', self.interface)
-        printer = self.__extract_status()
-        # self.device.write(self.out_ep, DLE_EOT_OFFLINE, self.interface)
-        # offline = self.__extract_status()
-        # self.device.write(self.out_ep, DLE_EOT_ERROR, self.interface)
-        # error = self.__extract_status()
-        # self.device.write(self.out_ep, DLE_EOT_PAPER, self.interface)
-        #   paper = self.__extract_status()
-
-        status['printer']['status_code'] = printer
-        # status['printer']['status_error'] = not ((printer & 147) == 18)
-        # status['printer']['online'] = not bool(printer & 8)
-        # status['printer']['recovery'] = bool(printer & 32)
-        # status['printer']['paper_feed_on'] = bool(printer & 64)
-        # status['printer']['drawer_pin_high'] = bool(printer & 4)
-        # status['offline']['status_code'] = offline
-        # status['offline']['status_error'] = not ((offline & 147) == 18)
-        # status['offline']['cover_open'] = bool(offline & 4)
-        # status['offline']['paper_feed_on'] = bool(offline & 8)
-        # status['offline']['paper'] = not bool(offline & 32)
-        # status['offline']['error'] = bool(offline & 64)
-        # status['error']['status_code'] = error
-        # status['error']['status_error'] = not ((error & 147) == 18)
-        # status['error']['recoverable'] = bool(error & 4)
-        # status['error']['autocutter'] = bool(error & 8)
-        # status['error']['unrecoverable'] = bool(error & 32)
-        # status['error']['auto_recoverable'] = not bool(error & 64)
-        # status['paper']['status_code'] = paper
-        # status['paper']['status_error'] = not ((paper & 147) == 18)
-        # status['paper']['near_end'] = bool(paper & 12)
-        # status['paper']['present'] = not bool(paper & 96)
-        print(status)
-        return status
+        """ Send ESC i S and return the decoded status block """
+        self.out_ep.write(STATUS_REQUEST)
+        return decode_status(self.__extract_status())
 
     def __del__(self):
         """ Release USB interface """
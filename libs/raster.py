@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Raster mode printing
+
+Description:
+Converts a NumPy array or PIL image into the raster commands of the PT series: the image is
+thresholded or dithered to 1 bit with array operations, packed with np.packbits into 70 byte
+lines (560 head pins, one line per dot along the tape) and emitted in a single buffer.
+"""
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .brotherprint import INITIALIZE, INVALIDATE, RASTER_MODE
+
+HEAD_PINS = 560
+LINE_BYTES = HEAD_PINS // 8
+
+# tape width in mm -> (left margin pins, printable pins) at 360 dpi
+TAPE_PINS = {3.5: (248, 48),
+             6: (240, 64),
+             9: (219, 106),
+             12: (197, 150),
+             18: (155, 234),
+             24: (112, 320),
+             36: (45, 454)}
+
+MEDIA_TYPES = {'laminated': 0x01,
+               'non-laminated': 0x03,
+               'heat-shrink': 0x11}
+
+PRINT_FEED = b'\x1a'
+PRINT_NO_FEED = b'\x0c'
+
+# 4x4 Bayer matrix, thresholds for ordered dithering
+BAYER_4 = ((0, 8, 2, 10),
+           (12, 4, 14, 6),
+           (3, 11, 1, 9),
+           (15, 7, 13, 5))
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('Raster printing requires numpy.')
+
+
+def to_gray(image):
+    """Returns a 2D uint8 array, 0 is black, from a PIL image or a NumPy array.
+
+    Args:
+        image: PIL image, 2D array (gray or bool, True is black) or 3D RGB(A) array
+    Returns:
+        numpy.ndarray
+    Raises:
+        RuntimeError: Unsupported image.
+    """
+    _require_numpy()
+    if hasattr(image, 'convert'):
+        return np.asarray(image.convert('L'), dtype=np.uint8)
+    array = np.asarray(image)
+    if array.dtype == np.bool_:
+        return np.where(array, 0, 255).astype(np.uint8)
+    if array.ndim == 3:
+        # ITU-R 601 luma of the RGB channels
+        array = array[..., 0] * 0.299 + array[..., 1] * 0.587 + array[..., 2] * 0.114
+    if array.ndim != 2:
+        raise RuntimeError('Unsupported image.')
+    return array.astype(np.uint8, copy=False)
+
+
+def to_1bit(image, threshold=128, dither=False):
+    """Converts an image to a bool array, True where a dot is printed.
+
+    Args:
+        image: anything to_gray() accepts
+        threshold: gray level under which a pixel is printed
+        dither: use 4x4 ordered dithering instead of a fixed threshold
+    Returns:
+        numpy.ndarray of bool
+    Raises:
+        None
+    """
+    gray = to_gray(image)
+    if not dither:
+        return gray < threshold
+    height, width = gray.shape
+    bayer = (np.asarray(BAYER_4, dtype=np.uint16) * 16 + 8)
+    tiled = np.tile(bayer, ((height + 3) // 4, (width + 3) // 4))[:height, :width]
+    return gray < tiled
+
+
+def pack_lines(bits, tape_width=24):
+    """Packs an image into raster lines for the tape.
+
+    The image height runs across the tape and is centered on the printable pins of the tape, every
+    image column becomes one raster line.
+
+    Args:
+        bits: 2D bool array from to_1bit()
+        tape_width: tape width in mm
+    Returns:
+        numpy.ndarray of uint8 with shape (lines, LINE_BYTES)
+    Raises:
+        RuntimeError: Invalid tape width.
+        RuntimeError: Image too high for the tape.
+    """
+    _require_numpy()
+    if tape_width not in TAPE_PINS:
+        raise RuntimeError('Invalid tape width.')
+    left, printable = TAPE_PINS[tape_width]
+    height, length = bits.shape
+    if height > printable:
+        raise RuntimeError('Image is %d dots high, the tape prints %d.' % (height, printable))
+    start = left + (printable - height) // 2
+    canvas = np.zeros((length, HEAD_PINS), dtype=np.bool_)
+    # head pin 0 is at the bottom edge of the printed image
+    canvas[:, start:start + height] = bits[::-1].T
+    return np.packbits(canvas, axis=1)
+
+
+def print_information(tape_width, lines, media_type='laminated', first_page=True):
+    """ESC i z, media and raster line count of the page"""
+    # the printer codes 3.5 mm tape as 4, like in the status block
+    width = 4 if tape_width == 3.5 else int(tape_width)
+    return (b'\x1biz' + bytes((0x86, MEDIA_TYPES[media_type], width, 0)) +
+            struct.pack('<I', lines) + bytes((0 if first_page else 1, 0)))
+
+
+def encode_lines(lines):
+    """Uncompressed raster transfer of every line, G n1 n2 data, in one buffer"""
+    _require_numpy()
+    count = lines.shape[0]
+    out = np.empty((count, 3 + LINE_BYTES), dtype=np.uint8)
+    out[:, 0] = ord('G')
+    out[:, 1:3] = np.frombuffer(struct.pack('<H', LINE_BYTES), dtype=np.uint8)
+    out[:, 3:] = lines
+    return out.tobytes()
+
+
+def encode_page(lines, tape_width=24, media_type='laminated', auto_cut=True, chain=False, margin=14, feed=True,
+                codec=None):
+    """Complete raster job of one page.
+
+    Args:
+        lines: packed raster lines from pack_lines()
+        tape_width: tape width in mm
+        media_type: 'laminated', 'non-laminated' or 'heat-shrink'
+        auto_cut: cut after the page
+        chain: do not feed and cut after the last page
+        margin: feed margin in dots
+        feed: print with feeding, as the last page of a job
+        codec: RasterCodec compressing the lines, uncompressed lines when None
+    Returns:
+        bytes
+    Raises:
+        None
+    """
+    header = (INVALIDATE + INITIALIZE + RASTER_MODE +
+              print_information(tape_width, lines.shape[0], media_type) +
+              b'\x1biM' + bytes((0x40 if auto_cut else 0,)) +
+              b'\x1biK' + bytes((0x00 if chain else 0x08,)) +
+              b'\x1bid' + struct.pack('<H', margin) +
+              (codec.mode_command if codec is not None else b'M\x00'))
+    data = codec.encode(lines) if codec is not None else encode_lines(lines)
+    return b''.join((header, data, PRINT_FEED if feed else PRINT_NO_FEED))
+
+
+def render_image(image, tape_width=24, threshold=128, dither=False, **options):
+    """Image to raster job bytes, options are passed to encode_page()"""
+    return encode_page(pack_lines(to_1bit(image, threshold, dither), tape_width), tape_width, **options)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Raster line compression
+
+Description:
+TIFF (PackBits) compression of raster lines for the PT series. Blank lines are sent as a single Z
+command and a line equal to the previous one reuses its encoded bytes; both are detected for the
+whole page at once with NumPy row comparisons.
+"""
+import struct
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+COMPRESSIONS = {None: b'M\x00',
+                'tiff': b'M\x02'}
+
+ZERO_LINE = b'Z'
+
+
+def packbits(line):
+    """PackBits encoding of one raster line.
+
+    Args:
+        line: bytes of the line
+    Returns:
+        bytes
+    Raises:
+        None
+    """
+    if not line:
+        return b''
+    return packbits_lines(np.frombuffer(line, dtype=np.uint8).reshape(1, -1))[0]
+
+
+def packbits_lines(lines):
+    """PackBits encoding of every line of a page.
+
+    The runs of equal bytes of the whole page are found with one set of array operations; only runs of
+    two or more bytes are looped over, the bytes between them are copied as literal slices.
+
+    Args:
+        lines: 2D uint8 array of packed lines
+    Returns:
+        list of bytes, one per line
+    Raises:
+        None
+    """
+    count, width = lines.shape
+    flat = np.ascontiguousarray(lines).ravel()
+    data = flat.tobytes()
+    change = np.ones(flat.size, dtype=np.bool_)
+    change[1:] = flat[1:] != flat[:-1]
+    # a run never continues into the next line
+    change[::width] = True
+    starts = np.flatnonzero(change)
+    lengths = np.diff(np.append(starts, flat.size))
+    repeats = lengths > 1
+    starts = starts[repeats]
+    lengths = lengths[repeats]
+    bounds = np.searchsorted(starts, np.arange(count + 1) * width).tolist()
+    starts = starts.tolist()
+    lengths = lengths.tolist()
+    encoded = []
+    for row in range(count):
+        out = bytearray()
+        position = row * width
+        for index in range(bounds[row], bounds[row + 1]):
+            start = starts[index]
+            length = lengths[index]
+            _literal(out, data, position, start)
+            end = start + length
+            while length > 1:
+                chunk = min(length, 128)
+                out.append(257 - chunk)
+                out.append(data[start])
+                length -= chunk
+            # a single byte left over from a run longer than 128 starts the next literal
+            position = end - length
+        _literal(out, data, position, (row + 1) * width)
+        encoded.append(bytes(out))
+    return encoded
+
+
+def _literal(out, data, start, end):
+    for offset in range(start, end, 128):
+        chunk = data[offset:min(offset + 128, end)]
+        out.append(len(chunk) - 1)
+        out.extend(chunk)
+
+
+def unpackbits(data):
+    """Decodes a PackBits line, the inverse of packbits()"""
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        header = data[i]
+        if header < 128:
+            out += data[i + 1:i + 2 + header]
+            i += 2 + header
+        elif header > 128:
+            out += bytes((data[i + 1],)) * (257 - header)
+            i += 2
+        else:
+            i += 1
+    return bytes(out)
+
+
+class RasterCodec(object):
+    """ Encodes packed raster lines for the wire and keeps the stats of the last page """
+
+    def __init__(self, compression='tiff'):
+        """
+        @param compression : 'tiff' for PackBits with blank line elision, None for raw lines
+        """
+        if compression not in COMPRESSIONS:
+            raise RuntimeError('Invalid raster compression.')
+        self.compression = compression
+        self.last_stats = None
+
+    @property
+    def mode_command(self):
+        return COMPRESSIONS[self.compression]
+
+    def encode(self, lines):
+        """Raster transfer commands of every line in one buffer.
+
+        Args:
+            lines: 2D uint8 array of packed lines
+        Returns:
+            bytes
+        Raises:
+            None
+        """
+        start = time.time()
+        count, width = lines.shape
+        stats = {'lines': count, 'blank': 0, 'repeated': 0, 'raw_bytes': count * (3 + width)}
+        if self.compression is None:
+            from .raster import encode_lines
+            data = encode_lines(lines)
+        else:
+            blank = ~lines.any(axis=1)
+            repeated = np.zeros(count, dtype=np.bool_)
+            if count > 1:
+                repeated[1:] = (lines[1:] == lines[:-1]).all(axis=1)
+            # a line equal to a blank one is blank too, so every other line follows an encoded one
+            encoded = iter(packbits_lines(lines[~blank & ~repeated]))
+            parts = []
+            previous = None
+            for index in range(count):
+                if blank[index]:
+                    parts.append(ZERO_LINE)
+                    stats['blank'] += 1
+                    continue
+                if repeated[index]:
+                    stats['repeated'] += 1
+                else:
+                    packed = next(encoded)
+                    previous = b'G' + struct.pack('<H', len(packed)) + packed
+                parts.append(previous)
+            data = b''.join(parts)
+        stats['wire_bytes'] = len(data)
+        stats['ratio'] = float(stats['raw_bytes']) / len(data) if data else 0.0
+        stats['seconds'] = time.time() - start
+        self.last_stats = stats
+        return data
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Process pool rendering
+
+Description:
+Encodes jobs into their final byte stream in worker processes, so raster rendering and large
+batches use every core while the BrotherDriver thread only writes to the printer. Workers run the
+same BrotherDriver.execute() code against a BrotherPrint that records instead of writing, and
+send the bytes back pickled.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from .brotherprint import BrotherPrint
+
+_logger = logging.getLogger(__name__)
+
+# tasks worth the round trip to a worker, a single barcode encodes faster than it pickles
+RENDER_TASKS = ('raster', 'batch', 'template')
+
+_driver = None
+
+
+class RecordingPrinter(object):
+    """ Session stand-in whose BrotherPrint only fills its buffer """
+
+    def __init__(self):
+        self.device = None
+        self.printer = BrotherPrint(None, None, BrotherPrint.USB_INTERFACE)
+        self.printer.begin_job()
+
+    def take(self):
+        return bytes(self.printer.buffer)
+
+
+def _init_worker(raster_compression):
+    global _driver
+    from .BrtotherDriver import BrotherDriver
+    _driver = BrotherDriver(status_interval=None, raster_compression=raster_compression)
+
+
+def render(task, data):
+    """Bytes of a job, run in a worker process.
+
+    Args:
+        task: task name
+        data: task data, raster jobs must carry their tape_width
+    Returns:
+        bytes
+    Raises:
+        Exception: encoding errors of the task.
+    """
+    session = RecordingPrinter()
+    _driver.execute(session, task, data)
+    return session.take()
+
+
+class RenderPool(object):
+    """ Pool of worker processes rendering jobs ahead of the printer """
+
+    def __init__(self, workers=None, raster_compression='tiff', tasks=RENDER_TASKS, start_method='spawn'):
+        """
+        @param workers            : number of processes, one per core when None
+        @param raster_compression : compression used by the workers for raster jobs
+        @param tasks              : tasks rendered in the pool, the others are encoded by the driver thread
+        @param start_method       : multiprocessing start method, spawn is safe with the driver threads running
+        """
+        self.tasks = set(tasks)
+        self.executor = ProcessPoolExecutor(workers, get_context(start_method), _init_worker, (raster_compression,))
+
+    def accepts(self, task):
+        return task in self.tasks
+
+    def submit(self, task, data):
+        """ concurrent.futures.Future of the job bytes """
+        return self.executor.submit(render, task, data)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait)
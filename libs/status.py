@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Printer status
+
+Description:
+Decoding of the 32 byte block the printer sends back to ESC i S, and a thread keeping the last
+decoded status of a BrotherDriver printer so get_status() never has to talk to the device.
+"""
+import logging
+import time
+from threading import Thread, Event
+
+_logger = logging.getLogger(__name__)
+
+STATUS_REQUEST = b'\x1biS'
+STATUS_SIZE = 32
+
+ERRORS_1 = ['no media', 'end of media', 'cutter jam', 'weak batteries', 'printer in use', 'printer turned off',
+            'high-voltage adapter', 'fan motor error']
+ERRORS_2 = ['replace media', 'expansion buffer full', 'communication error', 'communication buffer full',
+            'cover open', 'overheating', 'black marking not detected', 'system error']
+
+MEDIA_TYPES = {0x00: 'no media',
+               0x01: 'laminated',
+               0x03: 'non-laminated',
+               0x11: 'heat-shrink tube 2:1',
+               0x13: 'fabric',
+               0x14: 'flexible id',
+               0x15: 'satin',
+               0x17: 'heat-shrink tube 3:1',
+               0xFF: 'incompatible'}
+
+STATUS_TYPES = {0x00: 'reply',
+                0x01: 'printing completed',
+                0x02: 'error',
+                0x04: 'turned off',
+                0x05: 'notification',
+                0x06: 'phase change'}
+
+PHASES = {0x00: 'receiving',
+          0x01: 'printing'}
+
+NOTIFICATIONS = {0x00: None,
+                 0x01: 'cover open',
+                 0x02: 'cover closed',
+                 0x03: 'cooling started',
+                 0x04: 'cooling finished'}
+
+
+def decode_status(raw):
+    """Decodes the status block sent back to ESC i S.
+
+    Args:
+        raw: the 32 status bytes
+    Returns:
+        dict with the errors, media width (mm), type and length, mode, status type and phase
+    Raises:
+        RuntimeError: Invalid status block.
+    """
+    raw = bytes(raw)
+    if len(raw) < STATUS_SIZE or raw[0] != 0x80:
+        raise RuntimeError('Invalid status block.')
+    errors = [name for bit, name in enumerate(ERRORS_1) if raw[8] & (1 << bit)]
+    errors += [name for bit, name in enumerate(ERRORS_2) if raw[9] & (1 << bit)]
+    return {
+        'model': raw[4],
+        'errors': errors,
+        'media_width': raw[10],
+        'media_type': MEDIA_TYPES.get(raw[11], raw[11]),
+        'media_length': raw[17],
+        'mode': raw[15],
+        'status_type': STATUS_TYPES.get(raw[18], raw[18]),
+        'phase': PHASES.get(raw[19], raw[19]),
+        'phase_number': raw[20] << 8 | raw[21],
+        'notification': NOTIFICATIONS.get(raw[22], raw[22]),
+    }
+
+
+class StatusMonitor(Thread):
+    """ Polls the printer status of a BrotherDriver every interval seconds.
+
+    Only the session the driver already has open is queried, under the driver
+    device lock so it never interleaves with a print transfer; without an open
+    session driver.probe() only looks for the printer.
+    """
+
+    def __init__(self, driver, interval=2.0):
+        Thread.__init__(self)
+        self.daemon = True
+        self.driver = driver
+        self.interval = interval
+        self.stopped = Event()
+        self.polls = 0
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.poll()
+            self.stopped.wait(self.interval)
+
+    def poll(self):
+        driver = self.driver
+        record = None
+        try:
+            if driver.device_lock.acquire(timeout=self.interval):
+                try:
+                    session = driver.session
+                    if session is not None and session.device is not None:
+                        record = session.get_printer_status()
+                finally:
+                    driver.device_lock.release()
+            if record is None and not driver.probe():
+                record = {'errors': ['printer not found']}
+        except Exception as e:
+            _logger.warning('status poll failed: ' + str(e))
+            record = {'errors': [str(e)]}
+        self.polls += 1
+        if record is not None:
+            record['time'] = time.time()
+            driver.status['printer'] = record
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""USB transfer engine
+
+Description:
+Writes large jobs to the bulk OUT endpoint in chunks of whole packets, with a timeout scaled to
+the chunk size instead of the pyusb default. A chunk the printer only partly accepted is resumed
+from the first byte not written. A timed out chunk is never sent again: pyusb does not tell how
+much of it reached the printer, so the job is aborted and the driver retries it after an
+invalidate, unless a label of it may already be printed. Between chunks the IN endpoint is
+drained of the status blocks the printer sends on its own, so an error stops the job at once
+instead of after the timeout. Every write() records its throughput.
+"""
+import errno
+import logging
+import time
+
+from .status import STATUS_SIZE, decode_status
+
+_logger = logging.getLogger(__name__)
+
+# packets per chunk: 16 KB on a 512 byte high speed endpoint, 2 KB on a full speed one
+PACKETS_PER_CHUNK = 32
+
+
+def is_timeout(error):
+    """ True for a pyusb timeout, without importing pyusb """
+    return getattr(error, 'errno', None) == errno.ETIMEDOUT or type(error).__name__ == 'USBTimeoutError'
+
+
+class ChunkedWriter(object):
+    """ Writes a job to a bulk endpoint in packet aligned chunks """
+
+    def __init__(self, out_ep, in_ep=None, packets=PACKETS_PER_CHUNK, base_timeout=5000, min_rate=20000,
+                 retries=3, status_every=16, status_timeout=5):
+        """
+        @param out_ep         : bulk OUT endpoint
+        @param in_ep          : bulk IN endpoint polled for status blocks between chunks, None to skip
+        @param packets        : wMaxPacketSize packets per chunk
+        @param base_timeout   : milliseconds added to every chunk timeout, covers the printer pausing to print
+        @param min_rate       : slowest accepted rate in bytes/s, sets the timeout of a chunk from its size
+        @param retries        : writes of a chunk in a row accepting no byte before giving up
+        @param status_every   : chunks between two status polls, 0 to poll only on a timeout
+        @param status_timeout : milliseconds to wait for a status block when polling
+        """
+        self.out_ep = out_ep
+        self.in_ep = in_ep
+        packet = getattr(out_ep, 'wMaxPacketSize', None) or 64
+        self.chunk_size = packet * packets
+        self.base_timeout = base_timeout
+        self.min_rate = min_rate
+        self.retries = retries
+        self.status_every = status_every
+        self.status_timeout = status_timeout
+        self.last_stats = None
+        # bytes of the current write() that may have reached the printer, a timed out chunk included
+        self.sent = 0
+
+    def timeout(self, size):
+        """ Milliseconds allowed for size bytes """
+        return int(self.base_timeout + 1000.0 * size / self.min_rate)
+
+    def poll_status(self):
+        """Reads a status block the printer sent on its own, if any.
+
+        Returns:
+            decoded status dict or None
+        Raises:
+            IOError: The printer reported an error.
+        """
+        if self.in_ep is None:
+            return None
+        try:
+            raw = bytes(self.in_ep.read(STATUS_SIZE, self.status_timeout))
+        except IOError as e:
+            if is_timeout(e):
+                return None
+            raise
+        if len(raw) < STATUS_SIZE:
+            return None
+        status = decode_status(raw)
+        if status['status_type'] == 'error' or status['errors']:
+            raise IOError('Printer error during transfer: %s' % ', '.join(status['errors']))
+        return status
+
+    def write(self, data):
+        """Writes data in chunks, resuming partial writes at the exact offset.
+
+        Args:
+            data: bytes-like object
+        Returns:
+            number of endpoint writes
+        Raises:
+            IOError: The printer reported an error, a chunk timed out or the printer stopped accepting data.
+        """
+        view = memoryview(data)
+        total = len(view)
+        start = time.time()
+        offset = writes = retries = stalls = chunks = 0
+        self.sent = 0
+        while offset < total:
+            size = min(self.chunk_size, total - offset)
+            try:
+                written = self.out_ep.write(view[offset:offset + size], self.timeout(size))
+            except IOError as e:
+                if is_timeout(e):
+                    # part of the chunk may be on the wire, sending it again would corrupt the job
+                    self.sent = offset + size
+                    _logger.warning('chunk at offset %d of %d timed out, aborting the job' % (offset, total))
+                    # a printer error explains the timeout better
+                    self.poll_status()
+                raise
+            writes += 1
+            # pyusb returns the number of bytes written, other endpoints may return None
+            written = size if written is None else written
+            if written <= 0:
+                # nothing of the chunk was accepted, it is safe to send it again
+                if stalls >= self.retries:
+                    raise IOError('Printer stopped accepting data at offset %d of %d.' % (offset, total))
+                stalls += 1
+                retries += 1
+                self.poll_status()
+                continue
+            stalls = 0
+            offset += written
+            self.sent = offset
+            chunks += 1
+            if self.status_every and chunks % self.status_every == 0 and offset < total:
+                self.poll_status()
+        seconds = time.time() - start
+        self.last_stats = {'bytes': total, 'writes': writes, 'retries': retries, 'seconds': seconds,
+                           'bytes_per_second': total / seconds if seconds > 0 else 0.0}
+        return writes
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Fixtures printing on the PT-9700 emulator.
+
+Run from the repository root: python -m pytest
+"""
+import errno
+
+import pytest
+
+from libs.BrtotherDriver import BrotherDriver
+from libs.emulator import EmulatedUSBPrinter
+from libs.transfer import ChunkedWriter
+
+
+class TimeoutEndpoint(object):
+    """ Bulk OUT endpoint in front of an emulated one, write number timeout_at delivers its first
+    delivered bytes to the printer and then times out, like a printer that stopped reading """
+
+    def __init__(self, ep, timeout_at, delivered=0):
+        self.ep = ep
+        self.wMaxPacketSize = ep.wMaxPacketSize
+        self.timeout_at = timeout_at
+        self.delivered = delivered
+        self.calls = 0
+        self.chunks = []
+
+    def write(self, data, timeout=None):
+        self.calls += 1
+        data = bytes(data)
+        self.chunks.append(data)
+        if self.calls == self.timeout_at:
+            if self.delivered:
+                self.ep.write(data[:self.delivered])
+            raise IOError(errno.ETIMEDOUT, 'Operation timed out')
+        return self.ep.write(data, timeout)
+
+
+@pytest.fixture
+def printer():
+    return EmulatedUSBPrinter()
+
+
+@pytest.fixture
+def timeout_on():
+    """ Makes write number timeout_at of a printer time out, returns the endpoint recording the chunks """
+    def install(printer, timeout_at, delivered=0):
+        ep = TimeoutEndpoint(printer.out_ep, timeout_at, delivered)
+        printer.printer.writer = ChunkedWriter(ep, printer.in_ep)
+        return ep
+    return install
+
+
+@pytest.fixture
+def make_driver():
+    """ Builds drivers printing on an emulated printer, stopped at the end of the test """
+    drivers = []
+
+    def make(printer, **kwargs):
+        kwargs.setdefault('status_interval', None)
+        kwargs.setdefault('backoff_base', 0.01)
+        driver = BrotherDriver(**kwargs)
+        driver.get_printer = lambda timings=None: printer
+        drivers.append(driver)
+        return driver
+    yield make
+    for driver in drivers:
+        driver.stop(10)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from libs.brotherprint import INVALIDATE
+from libs.idempotency import IdempotencyIndex
+
+LABEL = {'label': 'L', 'data': '1', 'company': 'C'}
+
+
+def test_duplicate_key_follows_the_first_job(printer, make_driver):
+    index = IdempotencyIndex()
+    first = make_driver(printer, idempotency=index, backoff_base=0.2)
+    second = make_driver(printer, idempotency=index)
+    attempts = []
+    transfer = first.transfer
+
+    def flaky(session, job, rendered=None):
+        attempts.append(job.id)
+        if len(attempts) < 3:
+            raise IOError('USB error')
+        return transfer(session, job, rendered)
+    first.transfer = flaky
+    handle = first.push_task('barcode', LABEL, key='order-1')
+    time.sleep(0.05)
+    # the second driver does not know the job, its handle follows the job of the first one
+    duplicate = second.push_task('barcode', LABEL, key='order-1')
+    assert duplicate.status == 'duplicate'
+    assert not duplicate.done()
+    handle.result(10)
+    assert duplicate.result(1) is None
+    assert index.state('order-1') == 'transmitted'
+    assert printer.emulator.stats['labels'] == 1
+
+
+def test_drop_oldest_fails_the_dropped_job(printer, make_driver):
+    driver = make_driver(printer, maxsize=1, full_policy='drop-oldest')
+    driver.queue.pause(60)
+    oldest = driver.push_task('barcode', LABEL)
+    newest = driver.push_task('barcode', LABEL)
+    with pytest.raises(RuntimeError, match='queue full'):
+        oldest.result(10)
+    driver.queue.resume()
+    newest.result(10)
+    assert printer.emulator.stats['labels'] == 1
+
+
+def test_status_jobs_are_served_while_paused(printer, make_driver):
+    driver = make_driver(printer)
+    driver.queue.pause(60)
+    label = driver.push_task('barcode', LABEL)
+    status = driver.push_task('status')
+    assert status.result(10) is driver.status
+    time.sleep(0.1)
+    assert not label.done()
+    assert printer.emulator.stats['labels'] == 0
+    driver.queue.resume()
+    label.result(10)
+    assert printer.emulator.stats['labels'] == 1
+
+
+def test_chunk_timeout_retries_the_label_after_an_invalidate(printer, make_driver, timeout_on):
+    ep = timeout_on(printer, 1)
+    driver = make_driver(printer)
+    handle = driver.push_task('barcode', LABEL)
+    handle.result(10)
+    assert handle.job.attempts == 1
+    # the timed out chunk is not written again, the retry starts with an invalidate
+    assert len(ep.chunks) == 2
+    assert ep.chunks[1].startswith(INVALIDATE + b'\x1b@')
+    assert printer.emulator.stats['labels'] == 1
+    assert printer.emulator.stats['unknown'] == 0
+
+
+def test_batch_timeout_after_its_first_labels_is_not_resent(printer, make_driver, timeout_on):
+    ep = timeout_on(printer, 2, delivered=1000)
+    driver = make_driver(printer)
+    handle = driver.push_batch('barcode', [LABEL] * 1000, key='batch-1')
+    with pytest.raises(IOError):
+        handle.result(10)
+    printed = printer.emulator.stats['labels']
+    assert 0 < printed < 1000
+    assert handle.job.partial
+    assert handle.job.attempts == 0
+    assert len(ep.chunks) == 2
+    # pushed again, the key does not print the batch a second time
+    assert driver.key_state('batch-1') == 'transmitted'
+    assert driver.push_batch('barcode', [LABEL] * 1000, key='batch-1').job is handle.job
+    driver.push_task('barcode', LABEL).result(10)
+    assert printer.emulator.stats['labels'] == printed + 1
+    assert printer.emulator.stats['unknown'] == 0
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from libs.emulator import PrinterEmulator
+from libs.status import STATUS_REQUEST, decode_status
+
+
+def test_command_split_across_writes():
+    emulator = PrinterEmulator()
+    # ESC ( C with its two parameter bytes arriving in the next write
+    emulator.feed(b'\x1b(C\x02\x00')
+    assert emulator.stats['commands'] == 0
+    emulator.feed(b'\x10\x00\x1b@')
+    assert emulator.stats['commands'] == 2
+    assert emulator.stats['unknown'] == 0
+
+
+def test_template_fields():
+    emulator = PrinterEmulator()
+    emulator.feed(b'\x1bia\x03^DI\x02\x00ab^ONtitle\x00^DI\x01\x00c^FF')
+    assert emulator.template_fields == {b'': b'ab', b'title': b'c'}
+    assert emulator.stats['template_prints'] == 1
+
+
+def test_status_of_3_5mm_tape():
+    emulator = PrinterEmulator(tape_width=3.5)
+    emulator.feed(STATUS_REQUEST)
+    status = decode_status(emulator.read())
+    assert status['media_width'] == 4
+    assert emulator.read() == b''
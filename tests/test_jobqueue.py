@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from queue import Empty, Full
+
+import pytest
+
+from libs.jobqueue import JobQueue, PrintJob, PRIORITY_STATUS
+
+
+def test_drop_oldest():
+    queue = JobQueue(2, 'drop-oldest')
+    first, second, third = PrintJob('barcode'), PrintJob('barcode'), PrintJob('barcode')
+    assert queue.put(first) is None
+    assert queue.put(second) is None
+    assert queue.put(third) is first
+    assert queue.qsize() == 2
+    assert queue.get(block=False) is second
+    assert queue.get(block=False) is third
+
+
+def test_reject_and_requeue_past_maxsize():
+    queue = JobQueue(1, 'reject')
+    queue.put(PrintJob('barcode'))
+    with pytest.raises(Full):
+        queue.put(PrintJob('barcode'))
+    # a job given back was already admitted
+    queue.requeue(PrintJob('barcode'))
+    assert queue.qsize() == 2
+
+
+def test_pause_serves_only_status_jobs():
+    queue = JobQueue()
+    label = PrintJob('barcode')
+    status = PrintJob('status', priority=PRIORITY_STATUS)
+    queue.pause(60)
+    queue.put(label)
+    queue.put(status)
+    assert queue.get(block=False) is status
+    with pytest.raises(Empty):
+        queue.get(block=False)
+    queue.resume()
+    assert queue.get(block=False) is label
+
+
+def test_drain_takes_delayed_jobs():
+    queue = JobQueue()
+    queued, delayed = PrintJob('barcode'), PrintJob('barcode')
+    queue.put(queued)
+    queue.requeue(delayed, 60)
+    assert set(queue.drain()) == set([queued, delayed])
+    assert queue.empty()
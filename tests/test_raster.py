@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from libs.brotherprint import INITIALIZE, INVALIDATE, RASTER_MODE
+from libs.emulator import EmulatedUSBPrinter
+from libs.raster import encode_page, pack_lines, print_information, to_1bit
+from libs.status import StatusMonitor
+
+
+def test_print_information_width_code():
+    # 3.5 mm tape has width code 4, the other widths are their size in mm
+    assert print_information(3.5, 10)[5] == 4
+    assert print_information(24, 10)[5] == 24
+
+
+def test_page_header_on_3_5mm_tape():
+    bits = to_1bit(np.zeros((40, 100), dtype=np.uint8))
+    data = encode_page(pack_lines(bits, 3.5), 3.5)
+    header = INVALIDATE + INITIALIZE + RASTER_MODE
+    assert len(INVALIDATE) == 200
+    assert data.startswith(header)
+    assert data[len(header):len(header) + 7] == b'\x1biz\x86\x01\x04\x00'
+
+
+def test_driver_prints_raster_for_the_3_5mm_tape_loaded(make_driver, monkeypatch):
+    printer = EmulatedUSBPrinter(tape_width=3.5)
+    sent = bytearray()
+    feed = printer.emulator.feed
+
+    def record(data):
+        sent.extend(data)
+        return feed(data)
+    monkeypatch.setattr(printer.emulator, 'feed', record)
+    driver = make_driver(printer)
+    # a first job opens the session the status monitor queries
+    driver.push_task('barcode', {'label': 'L', 'data': '1', 'company': 'C'}).result(10)
+    StatusMonitor(driver).poll()
+    assert driver.tape_width() == 3.5
+    del sent[:]
+    driver.push_task('raster', {'image': np.zeros((40, 100), dtype=np.bool_)}).result(10)
+    assert b'\x1biz\x86\x01\x04\x00' in sent
+    assert printer.emulator.stats['labels'] == 2
+    assert printer.emulator.stats['unknown'] == 0
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from libs.emulator import PrinterEmulator
+from libs.rastercodec import RasterCodec, packbits, packbits_lines, unpackbits
+
+
+def test_packbits_round_trip():
+    rng = np.random.RandomState(0)
+    lines = [b'', b'\x00', b'\x00' * 70, b'\x00' * 128, b'\x00' * 129, b'\x00' * 257, b'ab',
+             b'a' * 129 + b'b', bytes(range(256)) * 2]
+    for _ in range(500):
+        size = rng.randint(1, 300)
+        line = rng.randint(0, rng.choice([2, 4, 256]), size) * (rng.rand(size) < 0.5)
+        lines.append(line.astype(np.uint8).tobytes())
+    for line in lines:
+        assert unpackbits(packbits(line)) == line
+
+
+def test_packbits_runs_and_literals():
+    assert packbits(b'\x00' * 70) == bytes((257 - 70, 0))
+    assert packbits(b'abc') == b'\x02abc'
+    # a run longer than 128 is split, its last byte starts the literal that follows
+    assert packbits(b'a' * 129 + b'b') == bytes((129,)) + b'a' + b'\x01ab'
+
+
+def test_packbits_lines_matches_packbits():
+    rng = np.random.RandomState(1)
+    lines = (rng.randint(0, 3, (40, 70)) * (rng.rand(40, 1) < 0.7)).astype(np.uint8)
+    assert packbits_lines(lines) == [packbits(line.tobytes()) for line in lines]
+
+
+def test_codec_lines_reach_the_emulator():
+    lines = np.zeros((30, 70), dtype=np.uint8)
+    lines[10:20, 30:40] = 0xff
+    lines[15] = 0x0f
+    codec = RasterCodec('tiff')
+    data = codec.encode(lines)
+    assert codec.last_stats['blank'] == 20
+    # lines 11 to 14 and 17 to 19 repeat the line before them
+    assert codec.last_stats['repeated'] == 7
+    emulator = PrinterEmulator()
+    emulator.feed(b'\x1bia\x01' + codec.mode_command + data + b'\x1a')
+    assert emulator.stats['raster_lines'] == 30
+    assert emulator.stats['labels'] == 1
+    assert emulator.stats['unknown'] == 0
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from libs.emulator import EmulatedUSBPrinter
+
+
+def test_chunk_timeout_is_not_resent(timeout_on):
+    printer = EmulatedUSBPrinter()
+    ep = timeout_on(printer, 2, delivered=1000)
+    writer = printer.printer.writer
+    payload = os.urandom(3 * writer.chunk_size)
+    with pytest.raises(IOError):
+        writer.write(payload)
+    # the first chunk went through, the second timed out and was not written again
+    assert ep.calls == 2
+    assert ep.chunks == [payload[:writer.chunk_size], payload[writer.chunk_size:2 * writer.chunk_size]]
+    assert printer.emulator.stats['bytes'] == writer.chunk_size + 1000
+    # the whole timed out chunk may have reached the printer
+    assert writer.sent == 2 * writer.chunk_size
+
+
+def test_chunks_are_packet_aligned(printer):
+    writer = printer.printer.writer
+    printer.printer.send(b'\x1bia\x00' + b'x' * (writer.chunk_size * 2 + 100) + b'\x0c')
+    assert writer.chunk_size % printer.out_ep.wMaxPacketSize == 0
+    assert writer.last_stats['writes'] == 3
+    assert printer.emulator.stats['labels'] == 1